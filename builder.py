@@ -58,6 +58,10 @@ class SurveyElementBuilder(object):
         self.set_sections(
             kwargs.get(u"sections", {})
             )
+        # A section_library.SectionLibrary of prebuilt included sections.
+        self._library = kwargs.get(u"library")
+        # Options shared between questions, see question.Option.interned.
+        self._interned_options = {}
 
     def set_sections(self, sections):
         """
@@ -67,12 +71,17 @@ class SurveyElementBuilder(object):
         """
         assert type(sections) == dict
         self._sections = sections
+        # Digests of the sections by name, see section_library.SectionLibrary.
+        self._section_digests = {}
 
-    def create_survey_element_from_dict(self, element_dict):
+    def create_survey_element_from_dict(self, element_dict,
+                                        question_type_dictionary=None):
         """
         Convert from a nested python dictionary/array structure
         (a json dict I call it because it corresponds directly with a json object)
         to a survey object
+        question_type_dictionary -- the question types of a question,
+                                    a copy of QUESTION_TYPE_DICT if None
         """
         if u"add_none_option" in element_dict:
             self._add_none_option = element_dict[u"add_none_option"]
@@ -86,14 +95,17 @@ class SurveyElementBuilder(object):
                 raise PyXFormError("This section has not been included.",
                                 section_name, self._sections.keys())
             element_dict = self._sections[section_name]
+            if self._library is not None:
+                return self._library.children(element_dict, self)
             full_survey = self.create_survey_element_from_dict(element_dict)
             return full_survey.children
         else:
-            question_type_dict_copy= copy_json_dict(QUESTION_TYPE_DICT) # FIXME: Why do we need a copy of this?
-            return self._create_question_from_dict(element_dict, question_type_dict_copy, self._add_none_option)
+            if question_type_dictionary is None:
+                question_type_dictionary = copy_json_dict(QUESTION_TYPE_DICT) # FIXME: Why do we need a copy of this?
+            return self._create_question_from_dict(element_dict, question_type_dictionary, self._add_none_option, self._interned_options)
 
     @staticmethod
-    def _create_question_from_dict(question_dict, question_type_dictionary, add_none_option=False):
+    def _create_question_from_dict(question_dict, question_type_dictionary, add_none_option=False, interned_options=None):
         question_type_str = question_dict[constants.TYPE]
         question_dict_copy = question_dict.copy()
         
@@ -107,7 +119,7 @@ class SurveyElementBuilder(object):
             question_type_str = question_type_str[:len(question_type_str) - len(or_other_str)]
             question_dict_copy["type"] = question_type_str
             SurveyElementBuilder._add_other_option_to_multiple_choice_question(question_dict_copy)
-            return [SurveyElementBuilder._create_question_from_dict(question_dict_copy, question_type_dictionary, add_none_option),
+            return [SurveyElementBuilder._create_question_from_dict(question_dict_copy, question_type_dictionary, add_none_option, interned_options),
                     SurveyElementBuilder._create_specify_other_question_from_dict(question_dict_copy)]
         
         question_class = SurveyElementBuilder._get_question_class(question_type_str, question_type_dictionary)
@@ -119,6 +131,9 @@ class SurveyElementBuilder(object):
             
         # todo: clean up this spaghetti code
         question_dict_copy[u"question_type_dictionary"] = question_type_dictionary
+        if interned_options is not None and \
+           issubclass(question_class, MultipleChoiceQuestion):
+            question_dict_copy[u"interned_options"] = interned_options
         if question_class:
             return question_class(**question_dict_copy)
         return []
@@ -210,6 +225,13 @@ class SurveyElementBuilder(object):
         columns = d_copy.pop(u"columns", [])
         result = GroupedSection(**d_copy)
 
+        # Find the fields to substitute in each child once, rather than for
+        # every column, and share one copy of the question types between all
+        # the questions of the loop.
+        templates = [(child, self._loop_substitution_fields(child))
+                     for child in children]
+        question_type_dict_copy = copy_json_dict(QUESTION_TYPE_DICT)
+
         # columns is a left over from when this was
         # create_table_from_dict, I will need to clean this up
         for column_dict in columns:
@@ -218,34 +240,56 @@ class SurveyElementBuilder(object):
             if column_dict[constants.NAME] == "none": continue
 
             column = GroupedSection(**column_dict)
-            for child in children:
-                question_dict = self._name_and_label_substitutions(child, column_dict)
-                question = self.create_survey_element_from_dict(question_dict)
+            for child, fields in templates:
+                question_dict = self._name_and_label_substitutions(
+                    child, column_dict, fields)
+                question = self.create_survey_element_from_dict(
+                    question_dict, question_type_dict_copy)
                 column.add_child(question)
             result.add_child(column)
         if result.name != u"":
             return result
         return result.children #TODO: Verify that nothing breaks if this returns a list
 
-    def _name_and_label_substitutions(self, question_template, column_headers):
+    @staticmethod
+    def _loop_substitution_fields(question_template):
+        """
+        Return the fields of a loop's question template with substitutions
+        for the column, as (key, None) for strings and (key, key2) for
+        strings in dicts. Other strings are the same for every column.
+        """
+        fields = []
+        for key, value in question_template.items():
+            if type(value) == unicode:
+                if u"%" in value:
+                    fields.append((key, None))
+            elif type(value) == dict:
+                fields.extend([(key, key2) for key2, value2 in value.items()
+                               if isinstance(value2, basestring) and
+                               u"%" in value2])
+        return fields
+
+    def _name_and_label_substitutions(self, question_template, column_headers, fields=None):
         # if the label in column_headers has multiple languages setup a
         # dictionary by language to do substitutions.
         if type(column_headers[u"label"]) == dict:
             info_by_lang = dict(
                 [(lang, {constants.NAME: column_headers[constants.NAME], u"label": column_headers[u"label"][lang]}) for lang in column_headers[u"label"].keys()]
                 )
+        if fields is None:
+            fields = self._loop_substitution_fields(question_template)
 
         result = question_template.copy()
         for key in result.keys():
-            if type(result[key]) == unicode:
-                result[key] = result[key] % column_headers
-            elif type(result[key]) == dict:
+            if type(result[key]) == dict:
                 result[key] = result[key].copy()
-                for key2 in result[key].keys():
-                    if type(column_headers[u"label"]) == dict:
-                        result[key][key2] = result[key][key2] % info_by_lang.get(key2, column_headers)
-                    else:
-                        result[key][key2] = result[key][key2] % column_headers
+        for key, key2 in fields:
+            if key2 is None:
+                result[key] = result[key] % column_headers
+            elif type(column_headers[u"label"]) == dict:
+                result[key][key2] = result[key][key2] % info_by_lang.get(key2, column_headers)
+            else:
+                result[key][key2] = result[key][key2] % column_headers
         return result
 
     def create_survey_element_from_json(self, str_or_path):
@@ -253,11 +297,12 @@ class SurveyElementBuilder(object):
         return self.create_survey_element_from_dict(d)
 
 
-def create_survey_element_from_dict(d, sections={}):
+def create_survey_element_from_dict(d, sections={}, library=None):
     """
     Creates a Survey from a dictionary in the format provided by SurveyReader
+    library -- a section_library.SectionLibrary to include sections from
     """
-    builder = SurveyElementBuilder()
+    builder = SurveyElementBuilder(library=library)
     builder.set_sections(sections)
     return builder.create_survey_element_from_dict(d)
 
@@ -282,17 +327,19 @@ def create_survey(
     id_string=None,
     title=None,
     default_language=None,
-    question_type_dictionary=None
+    question_type_dictionary=None,
+    library=None
     ):
     """
     name_of_main_section -- a string key used to find the main section in the sections dict if it is not supplied in the main_section arg
     main_section -- a json dict that represents a survey
     sections -- a dictionary of sections that can be drawn from to build the survey
+    library -- a section_library.SectionLibrary to include sections from
     This function uses the builder class to create and return a survey.
     """
     if main_section == None:
         main_section = sections[name_of_main_section]
-    builder = SurveyElementBuilder()
+    builder = SurveyElementBuilder(library=library)
     builder.set_sections(sections)
 
     #assert name_of_main_section in sections, name_of_main_section
@@ -314,23 +361,30 @@ def create_survey(
     return survey
 
 
-def create_survey_from_path(path, include_directory=False):
+def create_survey_from_path(path, include_directory=False, processes=None,
+                            library=None):
     """
-    include_directory -- Switch to indicate that all the survey forms in
-                         the same directory as the specified file should be read
-                         so they can be included through include types.
+    include_directory -- Switch to indicate that the survey forms in
+                         the same directory as the specified file can be
+                         included through include types. Only the included
+                         forms are read, in parallel and cached.
+    processes -- The number of processes reading included forms,
+                 the cpu count if None.
+    library -- a section_library.SectionLibrary to include sections from
     @see: create_survey
     """
     directory, file_name = os.path.split(path)
     main_section_name = file_utils._section_name(file_name)
     if include_directory:
-        main_section_name = file_utils._section_name(file_name)
-        sections = file_utils.collect_compatible_files_in_directory(directory)
+        sections = file_utils.load_files_to_dicts([path])
+        sections.update(file_utils.collect_included_sections(
+            directory, sections[main_section_name], processes))
     else:
         main_section_name, section = file_utils.load_file_to_dict(path)
         sections = {main_section_name: section}
     pkg = {
         u'name_of_main_section': main_section_name,
-        u'sections': sections
+        u'sections': sections,
+        u'library': library
         }
     return create_survey(**pkg)
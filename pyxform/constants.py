@@ -186,3 +186,9 @@ CHOICES = u"choices"
 COLUMNS = u"columns" #this is for loop statements
 CHOICES_AND_COLUMNS = u"choices and columns"
 CASCADING_CHOICES = u"cascades"
+
+# Settings sheet column holding the number of select questions that must use
+# a choice list before it is emitted once as a secondary instance (itemset)
+# instead of being copied into every question. Zero disables sharing.
+SHARED_CHOICES_THRESHOLD = u"shared_choices_threshold"
+DEFAULT_SHARED_CHOICES_THRESHOLD = 10
@@ -1,15 +1,34 @@
 import os
 import glob
+import hashlib
+import collections
+import multiprocessing
+import cPickle
 import utils
 #from xlrd import open_workbook
 
 from xls2json import SurveyReader
 
+# The number of files whose sections load_files_to_dicts keeps.
+SECTION_CACHE_SIZE = 128
+
+# Sections loaded by load_files_to_dicts, least recently used first, by path:
+# [(mtime, size), sha1 of the file, pickled (section name, section dict)].
+_section_cache = collections.OrderedDict()
+
 def _section_name(path_or_file_name):
     directory, filename = os.path.split(path_or_file_name)
     section_name, extension = os.path.splitext(filename)
     return section_name
 
+def _file_stat(path):
+    stat = os.stat(path)
+    return (stat.st_mtime, stat.st_size)
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
 def load_file_to_dict(path):
     """
     Takes a file path and loads it into a nested json dict following the format in json_form_schema.json
@@ -23,11 +42,102 @@ def load_file_to_dict(path):
         excel_reader = SurveyReader(path)
         return (name, excel_reader.to_json_dict())
 
-def collect_compatible_files_in_directory(directory):
+def load_files_to_dicts(paths, processes=None):
     """
-    create a giant dict out of all the spreadsheets and json forms in the given directory
+    Load the files at paths like load_file_to_dict and return a dict of
+    their sections by name. The sections of the last SECTION_CACHE_SIZE
+    files are cached. A file whose mtime and size are unchanged is not read
+    again; otherwise it is only parsed again if its contents changed.
+    Files that have to be parsed are parsed in a pool of processes (cpu
+    count if None) when there is more than one.
+    """
+    stale = []
+    sections = {}
+    for path in paths:
+        stat = _file_stat(path)
+        digest = None
+        cached = _section_cache.pop(path, None)
+        if cached is not None and cached[0] != stat:
+            digest = _file_digest(path)
+            if cached[1] == digest:
+                cached[0] = stat
+            else:
+                cached = None
+        if cached is not None:
+            _section_cache[path] = cached
+            sections[path] = cached[2]
+        else:
+            stale.append((path, stat, digest or _file_digest(path)))
+    processes = min(processes or multiprocessing.cpu_count(), len(stale))
+    stale_paths = [path for path, stat, digest in stale]
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            loaded = pool.map(load_file_to_dict, stale_paths)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        loaded = [load_file_to_dict(path) for path in stale_paths]
+    for (path, stat, digest), name_and_section in zip(stale, loaded):
+        pickled = cPickle.dumps(name_and_section, cPickle.HIGHEST_PROTOCOL)
+        _section_cache[path] = [stat, digest, pickled]
+        sections[path] = pickled
+    while len(_section_cache) > SECTION_CACHE_SIZE:
+        _section_cache.popitem(last=False)
+    # The builder changes the sections it is given, so each call gets its
+    # own copies, unpickled from the cache.
+    return dict([cPickle.loads(sections[path]) for path in paths])
+
+def list_compatible_files_in_directory(directory):
+    """
+    Return a dict of the paths of the spreadsheets and json forms in the given
+    directory by section name. A json form takes precedence over a
+    spreadsheet with the same name.
     """
-    #sections = {}
     available_files = glob.glob(os.path.join(directory, "*.xls")) + \
                         glob.glob(os.path.join(directory, "*.json"))
-    return dict([load_file_to_dict(f) for f in available_files])
+    return dict([(_section_name(f), f) for f in available_files])
+
+def collect_compatible_files_in_directory(directory, processes=None):
+    """
+    create a giant dict out of all the spreadsheets and json forms in the given directory
+    """
+    #sections = {}
+    return load_files_to_dicts(
+        list_compatible_files_in_directory(directory).values(), processes)
+
+def _included_section_names(section):
+    """
+    Return the set of names of the sections included by include types in the
+    given section dict.
+    """
+    names = set()
+    pending = [section]
+    while pending:
+        element = pending.pop()
+        if element.get(u"type") == u"include":
+            names.add(element[u"name"])
+        pending.extend(element.get(u"children", []))
+    return names
+
+def collect_included_sections(directory, section, processes=None):
+    """
+    Return a dict of the sections in the given directory that are included by
+    the given section dict, directly or through other included sections.
+    Only those sections are loaded, each level of includes in parallel
+    (@see load_files_to_dicts). Missing sections are left out.
+    """
+    available_files = list_compatible_files_in_directory(directory)
+    sections = {}
+    names = _included_section_names(section)
+    while names:
+        loaded = load_files_to_dicts(
+            [available_files[name] for name in names
+             if name in available_files], processes)
+        sections.update(loaded)
+        names = set()
+        for included_section in loaded.values():
+            names.update(_included_section_names(included_section))
+        names.difference_update(sections)
+    return sections
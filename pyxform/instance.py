@@ -1,3 +1,5 @@
+from cStringIO import StringIO
+
 from xform_instance_parser import parse_xform_instance
 
 
@@ -13,10 +15,9 @@ class SurveyInstance(object):
         self._name = self._survey.name
         self._id = self._survey.id_string
 
-        # get xpaths
-        #  - prep for xpaths.
-        self._survey.xml()
-        self._xpaths = self._survey._xpath.values()
+        # get xpaths without generating the xform
+        self._xpath = self._survey.xpath_index()
+        self._xpaths = self._xpath.values()
         
         #see "answers(self):" below for explanation of this dict
         self._answers = {}
@@ -26,20 +27,13 @@ class SurveyInstance(object):
         return self._keys
     
     def xpaths(self):
-        #originally thought of having this method get the xpath stuff
-        #but survey doesn't like when xml() is called multiple times.
         return self._xpaths
 
     def answer(self, name=None, value=None):
         if name is None:
             raise Exception("In answering, name must be given")
-        
-        #ahh. this is horrible, but we need the xpath dict in survey to be up-to-date
-        #...maybe
-      # self._survey.xml()
-
 
-        if name in self._survey._xpath.keys():
+        if name in self._xpath:
             self._answers[name] = value
         else:
             self._orphan_answers[name] = value
@@ -56,16 +50,12 @@ class SurveyInstance(object):
         
     def to_xml(self):
         """
-        A horrible way to do this, but it works (until we need the attributes pumped out in order, etc)
+        Write the answers into the survey's instance with the survey's
+        cached instance_writer().
         """
-        open_str = """<?xml version='1.0' ?><%s id="%s">""" % (self._name, self._id)
-        close_str = """</%s>""" % self._name
-        vals = ""
-        for k, v in self._answers.items():
-            vals += "<%s>%s</%s>" % (k, str(v), k)
-        
-        output = open_str + vals + close_str
-        return output
+        f = StringIO()
+        self._survey.instance_writer().write(self._answers, f)
+        return f.getvalue().decode("utf-8")
 
     def answers(self):
         """
@@ -0,0 +1,122 @@
+"""
+Write submissions of a survey from dicts of answers.
+@see survey.Survey.instance_writer
+"""
+from datetime import date
+from xml.dom.minidom import Element
+from xml.sax.saxutils import escape, quoteattr
+
+XML_DECLARATION = "<?xml version='1.0' ?>"
+
+
+def _text(value):
+    if isinstance(value, (list, tuple)):
+        value = u" ".join([unicode(item) for item in value])
+    elif isinstance(value, date):
+        value = value.isoformat()
+    return escape(unicode(value)).encode("utf-8")
+
+
+class _Leaf(object):
+    __slots__ = ["name", "open", "close", "empty", "default"]
+
+    def __init__(self, name, open_tag, close_tag, default):
+        self.name = name
+        self.open = open_tag
+        self.close = close_tag
+        self.empty = open_tag[:-1] + "/>"
+        self.default = default
+
+
+class _Repeat(object):
+    __slots__ = ["name", "template"]
+
+    def __init__(self, name, template):
+        self.name = name
+        self.template = template
+
+
+class InstanceWriter(object):
+    """
+    Writes submissions of a survey as XML. The survey's instance is compiled
+    once into a template: a list of the utf-8 encoded markup between answers,
+    with adjacent markup merged into one string, and the answer slots of
+    questions and repeats. Repeats have a template of their own, without the
+    jr:template attribute, which is written once for each of their answers.
+    Groups are only markup, so writing a submission is a single pass over the
+    template with no tree built.
+    Answers are a dict by question name, the answer of a repeat is a list of
+    such dicts. Questions without an answer get their default, questions
+    answered None are empty.
+    """
+
+    def __init__(self, survey):
+        self.template = []
+        self._compile(survey.xml_instance(), self.template)
+        self.template = self._merge(self.template)
+
+    @staticmethod
+    def _open_tag(element, skip=()):
+        attributes = sorted([(name, value) for name, value
+                             in element.attributes.items()
+                             if name not in skip])
+        return (u"<%s%s>" % (element.tagName, u"".join([
+            u" %s=%s" % (name, quoteattr(value))
+            for name, value in attributes]))).encode("utf-8")
+
+    def _compile(self, element, template):
+        children = [child for child in element.childNodes
+                    if isinstance(child, Element)]
+        close_tag = (u"</%s>" % element.tagName).encode("utf-8")
+        if element.hasAttribute(u"jr:template"):
+            repeat_template = []
+            repeat_template.append(self._open_tag(element, [u"jr:template"]))
+            for child in children:
+                self._compile(child, repeat_template)
+            repeat_template.append(close_tag)
+            template.append(
+                _Repeat(element.tagName, self._merge(repeat_template)))
+        elif children or element.parentNode is None:
+            template.append(self._open_tag(element))
+            for child in children:
+                self._compile(child, template)
+            template.append(close_tag)
+        else:
+            default = u"".join([child.data for child in element.childNodes])
+            template.append(_Leaf(element.tagName, self._open_tag(element),
+                                  close_tag, default or None))
+
+    @staticmethod
+    def _merge(template):
+        merged = []
+        for item in template:
+            if isinstance(item, str) and merged and \
+               isinstance(merged[-1], str):
+                merged[-1] += item
+            else:
+                merged.append(item)
+        return merged
+
+    def _write(self, template, answers, write):
+        for item in template:
+            if isinstance(item, str):
+                write(item)
+            elif isinstance(item, _Leaf):
+                value = answers.get(item.name, item.default)
+                if value is None or value == u"":
+                    write(item.empty)
+                else:
+                    write(item.open)
+                    write(_text(value))
+                    write(item.close)
+            else:
+                for repeat_answers in answers.get(item.name, ()):
+                    self._write(item.template, repeat_answers, write)
+
+    def write(self, answers, f, xml_declaration=True):
+        """
+        Write the submission with the given answers to the file-like object f.
+        """
+        if xml_declaration:
+            f.write(XML_DECLARATION)
+        self._write(self.template, answers, f.write)
@@ -3,7 +3,6 @@ import re
 import tempfile
 import codecs
 from datetime import datetime
-from collections import defaultdict
 
 # 'pyxform'-internal.
 import pyxform.survey_to_xlsform
@@ -13,6 +12,11 @@ from utils import node
 from odk_validate import check_xform
 from survey_element import SurveyElement
 from errors import PyXFormError
+from translations import TranslationTable
+from submission_decoder import SubmissionDecoder
+from submission_export import SubmissionExport
+from instance_writer import InstanceWriter
+from submission_generator import SubmissionGenerator
 from pyxform import constants
 import cStringIO
 
@@ -32,6 +36,7 @@ class Survey(Section):
     FIELDS.update(
         {
             u"_xpath": dict,
+            u"_instance_writer": lambda: None,
             u"_created": datetime.now, #This can't be dumped to json
             constants.TITLE: unicode,
             constants.ID_STRING: unicode,
@@ -44,6 +49,7 @@ class Survey(Section):
             u"file_name": unicode,
             constants.DEFAULT_LANGUAGE: unicode,
             u"_translations": dict,
+            u"_choice_lists": dict,
             constants.SUBMISSION_URL: unicode,
             constants.PUBLIC_KEY: unicode,
             u"instance_xmlns": unicode,
@@ -86,21 +92,55 @@ class Survey(Section):
                     **nsmap
                     )
 
+    def _setup_choice_lists(self):
+        """
+        Walk every choice of every list in self.choices once and split it into
+        the columns used to generate the static instances and their itext:
+        {list_name : (itext_ids, instance_columns, translations)}
+        itext_ids -- the unique id of each choice, referenced by its itext
+        instance_columns -- per choice, the (property, value) pairs of its <item>
+        translations -- (language, itext_id, form, value) tuples
+        @see _generate_static_instances _setup_translations
+        """
+        self._choice_lists = {}
+        for list_name, choice_list in self.choices.items():
+            #Add a unique id to each choice incase there is itext it refrences
+            itext_id_prefix = u'-'.join([u'static_instance', list_name, u''])
+            itext_ids = [itext_id_prefix + unicode(idx)
+                         for idx in xrange(len(choice_list))]
+            instance_columns = []
+            translations = []
+            for itextId, choice in zip(itext_ids, choice_list):
+                choice_columns = []
+                for choicePropertyName, choicePropertyValue in choice.items():
+                    if isinstance(choicePropertyValue, dict):
+                        for mediatypeorlanguage, value in choicePropertyValue.items():
+                            if isinstance(value, dict):
+                                for langauge, value in value.items():
+                                    translations.append((langauge, itextId, mediatypeorlanguage, value))
+                            elif choicePropertyName == 'media':
+                                translations.append((self.default_language, itextId, mediatypeorlanguage, value))
+                            else:
+                                translations.append((mediatypeorlanguage, itextId, 'long', value))
+                    elif choicePropertyName == 'label':
+                        translations.append((self.default_language, itextId, 'long', choicePropertyValue))
+                    elif isinstance(choicePropertyValue, basestring):
+                        choice_columns.append((choicePropertyName, unicode(choicePropertyValue)))
+                instance_columns.append(choice_columns)
+            self._choice_lists[list_name] = (itext_ids, instance_columns, translations)
+
     def _generate_static_instances(self):
         """
         Generates <instance> elements for static data (e.g. choices for select type questions)
+        @see _setup_choice_lists
         """
-        for list_name, choice_list in self.choices.items():
+        for list_name in self.choices.keys():
+            itext_ids, instance_columns, _ = self._choice_lists[list_name]
             instance_element_list = []
-            for idx, choice in zip(range(len(choice_list)), choice_list):
-                choice_element_list = []
-                #Add a unique id to the choice element incase there is itext it refrences
-                itextId = '-'.join(['static_instance', list_name, str(idx)])
-                choice_element_list.append(node("itextId", itextId))
-
-                for choicePropertyName, choicePropertyValue in choice.items():
-                    if isinstance(choicePropertyValue, basestring) and choicePropertyName != 'label':
-                        choice_element_list.append(node(choicePropertyName, unicode(choicePropertyValue)))
+            for itextId, choice_columns in zip(itext_ids, instance_columns):
+                choice_element_list = [node("itextId", itextId)]
+                for choicePropertyName, choicePropertyValue in choice_columns:
+                    choice_element_list.append(node(choicePropertyName, choicePropertyValue))
                 instance_element_list.append(node("item", *choice_element_list))
             yield node("instance", node("root", *instance_element_list), id=list_name)
 
@@ -108,6 +148,7 @@ class Survey(Section):
         """
         Generate the xform <model> element
         """
+        self._setup_choice_lists()
         self._setup_translations()
         self._setup_media()
         self._add_empty_translations()
@@ -141,40 +182,20 @@ class Survey(Section):
             result.setAttribute(constants.VERSION, self.version)
         return result
 
-    def _add_to_nested_dict(self, dicty, path, value):
-        if len(path) == 1:
-            dicty[path[0]] = value
-            return
-        if path[0] not in dicty:
-            dicty[path[0]] = {}
-        self._add_to_nested_dict(dicty[path[0]], path[1:], value)
-
     def _setup_translations(self):
         """
-        set up the self._translations dict which will be referenced in the setup media and itext functions
+        set up the self._translations table which will be referenced in the setup media and itext functions
         """
-        self._translations = defaultdict(dict)
+        self._translations = TranslationTable()
         for element in self.iter_descendants():
             for d in element.get_translations(self.default_language):
-                self._translations[d['lang']][d['path']] = {"long" : d['text']}
+                self._translations.add(d['lang'], d['path'], "long", d['text'])
 
         #This code sets up translations for choices in filtered selects.
-        for list_name, choice_list in self.choices.items():
-            for idx, choice in zip(range(len(choice_list)), choice_list):
-                for choicePropertyName, choicePropertyValue in choice.items():
-                    itextId = '-'.join(['static_instance', list_name, str(idx)])
-                    if isinstance(choicePropertyValue, dict):
-                        for mediatypeorlanguage, value in choicePropertyValue.items():
-                            if isinstance(value, dict):
-                                for langauge, value in value.items():
-                                    self._add_to_nested_dict(self._translations, [langauge, itextId, mediatypeorlanguage], value)
-                            else:
-                                if choicePropertyName == 'media':
-                                    self._add_to_nested_dict(self._translations, [self.default_language, itextId, mediatypeorlanguage], value)
-                                else:
-                                    self._add_to_nested_dict(self._translations, [mediatypeorlanguage, itextId, 'long'], value)
-                    elif choicePropertyName == 'label':
-                        self._add_to_nested_dict(self._translations, [self.default_language, itextId, 'long'], choicePropertyValue)
+        for list_name in self.choices.keys():
+            _, _, translations = self._choice_lists[list_name]
+            for language, itextId, form, value in translations:
+                self._translations.add(language, itextId, form, value)
 
     def _add_empty_translations(self):
         """
@@ -182,27 +203,16 @@ class Survey(Section):
         When translations are not provided "-" will be used.
         This disables any of the default_language fallback functionality.
         """
-        paths = {}
-        for lang, translation in self._translations.items():
-            for path, content in translation.items():
-                paths[path] = paths.get(path, set()).union(content.keys())
-
-        for lang, translation in self._translations.items():
-            for path, content_types in paths.items():
-                if path not in self._translations[lang]:
-                    self._translations[lang][path] = {}
-                for content_type in content_types:
-                    if content_type not in self._translations[lang][path]:
-                        self._translations[lang][path][content_type] = u"-"
+        self._translations.add_empty_translations(u"-")
 
     def _setup_media(self):
         """
-        Traverse the survey, find all the media, and put in into the _translations data structure which looks like this:
-        {language : {element_xpath : {media_type : media}}}
+        Traverse the survey, find all the media, and put in into the _translations table which is keyed like this:
+        (language, element_xpath, media_type) -> media
         It matches the xform nesting order.
         """
         if not self._translations:
-            self._translations = defaultdict(dict)
+            self._translations = TranslationTable()
 
         for survey_element in self.iter_descendants():
 
@@ -224,26 +234,7 @@ class Survey(Section):
                     localized_media = { self.default_language : possibly_localized_media }
 
                 for language, media in localized_media.items():
-
-                    #Create the required dictionaries in _translations, then add media as a leaf value:
-
-                    if language not in self._translations:
-                        self._translations[language] = {}
-
-                    translations_language = self._translations[language]
-
-                    if translation_key not in translations_language:
-                        translations_language[translation_key] = {}
-
-                    #if type(translations_language[translation_key]) is not dict:
-                    #    translations_language[translation_key] = {"long" : translations_language[translation_key]}
-
-                    translations_trans_key = translations_language[translation_key]
-
-                    if media_type not in translations_trans_key:
-                            translations_trans_key[media_type] = {}
-
-                    translations_trans_key[media_type] = media
+                    self._translations.add(language, translation_key, media_type, media)
 
     def itext(self):
         """
@@ -253,20 +244,18 @@ class Survey(Section):
         @see http://code.google.com/p/opendatakit/wiki/XFormDesignGuidelines
         """
         result = []
-        for lang, translation in self._translations.items():
+        for lang in self._translations.languages():
             if lang == self.default_language:
                 result.append(node("translation", lang=lang, default=u"true()"))
                 #result.append(node("translation", lang=lang))
             else:
                 result.append(node("translation", lang=lang))
 
-            for label_name, content in translation.items():
+            for label_name, content in self._translations.iter_translations(lang):
                 itext_nodes = []
                 label_type = label_name.partition(":")[-1]
 
-                if type(content) is not dict: raise Exception()
-
-                for media_type, media_value in content.items():
+                for media_type, media_value in content:
 
                     #There is a odk/jr bug where hints can't have a value for the "form" attribute.
                     #This is my workaround.
@@ -318,13 +307,39 @@ class Survey(Section):
         return "<survey name='%s' element_count='%s'>" % (self.name, len(self.children))
 
     def _setup_xpath_dictionary(self):
+        """
+        Map the name of every question and section to its xpath, or None if
+        more than one element has that name. Sections pass their xpath down
+        to their children instead of each element walking its lineage. Like
+        get_lineage, flat groups are left out of the xpaths.
+        """
         self._xpath = {}
-        for element in self.iter_descendants():
-            if isinstance(element, Question) or isinstance(element, Section):
-                if element.name in self._xpath:
-                    self._xpath[element.name] = None
-                else:
-                    self._xpath[element.name] = element.get_xpath()
+        self._instance_writer = None
+        stack = [(self, u"")]
+        while stack:
+            element, parent_xpath = stack.pop()
+            if element is not self and element.get(u"flat"):
+                xpath = parent_xpath
+            else:
+                xpath = parent_xpath + u"/" + element.name
+            if element.name in self._xpath:
+                self._xpath[element.name] = None
+            else:
+                self._xpath[element.name] = xpath
+            if isinstance(element, Section):
+                stack.extend([(child, xpath) for child in element.children
+                              if isinstance(child, (Question, Section))])
+
+    def xpath_index(self):
+        """
+        Return the name to xpath dictionary of the questions and sections,
+        building it without generating the XForm. It is cached until xml()
+        rebuilds it, so call _setup_xpath_dictionary after adding elements
+        to a survey that has already been indexed.
+        """
+        if not self._xpath:
+            self._setup_xpath_dictionary()
+        return self._xpath
 
     def _var_repl_function(self, matchobj):
         """
@@ -439,6 +454,44 @@ class Survey(Section):
         from instance import SurveyInstance
         return SurveyInstance(self)
 
+    def submission_decoder(self):
+        """
+        Compile a decoder of this survey's submissions into typed records.
+        Compiling walks the whole survey, so reuse the decoder for every
+        submission.
+        @see submission_decoder.SubmissionDecoder
+        """
+        return SubmissionDecoder(self)
+
+    def submission_export(self):
+        """
+        Compile an export of this survey's submissions into a table for the
+        survey and one for each repeat.
+        @see submission_export.SubmissionExport
+        """
+        return SubmissionExport(self)
+
+    def instance_writer(self):
+        """
+        Return the writer of submissions of this survey from answers. It is
+        compiled the first time and cached like xpath_index() until the
+        xpath dictionary is set up again.
+        @see instance_writer.InstanceWriter
+        """
+        if self._instance_writer is None:
+            # Indexing later would drop the writer.
+            self.xpath_index()
+            self._instance_writer = InstanceWriter(self)
+        return self._instance_writer
+
+    def submission_generator(self, seed=None, max_repeats=3):
+        """
+        Compile a generator of random submissions of this survey for load
+        testing.
+        @see submission_generator.SubmissionGenerator
+        """
+        return SubmissionGenerator(self, seed=seed, max_repeats=max_repeats)
+
 
     def to_xform(self, path=None, warnings=None):
         '''
@@ -465,6 +518,15 @@ class Survey(Section):
         return pyxform.survey_to_xlsform.to_xls(self, path, warnings=warnings)
 
 
+    def to_xlsx(self, path=None, warnings=None):
+        '''
+        Wrapper around 'pyxform.survey_to_xlsform.to_xlsx'; see that function for 
+        documentation.
+        '''
+        
+        return pyxform.survey_to_xlsform.to_xlsx(self, path, warnings=warnings)
+
+
     def to_csv(self, path=None, warnings=None, koboform=False):
         '''
         Wrapper around 'pyxform.survey_to_xlsform.to_csv'; see that function for 
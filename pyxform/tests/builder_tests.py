@@ -1,7 +1,8 @@
 import re
 from lxml import etree
 from unittest import TestCase
-from pyxform.builder import SurveyElementBuilder, create_survey_from_xls
+from pyxform.builder import SurveyElementBuilder, create_survey_from_xls, \
+    create_survey_element_from_dict
 from pyxform.xls2json import print_pyobj_to_json
 from pyxform import Survey, InputQuestion, constants
 from pyxform.errors import PyXFormError
@@ -585,3 +586,64 @@ class BuilderTests(TestCase):
             [c for c in root_elm.getchildren()])
         self.assertEqual(len(body_elms), 1)
         self.assertEqual(body_elms[0].get('class'), 'ltr')
+
+    def test_static_instance_itext_ids(self):
+        survey = create_survey_element_from_dict({
+            u'type': u'survey',
+            u'name': u'static_instances',
+            u'id_string': u'static_instances',
+            u'choices': {
+                u'colors': [
+                    {u'name': u'red', u'label': {u'English': u'Red',
+                                                 u'French': u'Rouge'}},
+                    {u'name': u'blue', u'label': {u'English': u'Blue'}},
+                ]
+            },
+            u'children': [{
+                u'type': u'select one',
+                u'name': u'color',
+                u'label': u'Color',
+                u'itemset': u'colors',
+                u'choice_filter': u"name != 'blue'",
+            }],
+        })
+        root_elm = etree.fromstring(survey._to_pretty_xml())
+        ns = {'x': 'http://www.w3.org/2002/xforms'}
+        self.assertEqual(
+            root_elm.xpath("//x:instance[@id='colors']//x:itextId/text()",
+                           namespaces=ns),
+            ['static_instance-colors-0', 'static_instance-colors-1'])
+        self.assertEqual(
+            root_elm.xpath(
+                "//x:translation[@lang='French']"
+                "/x:text[@id='static_instance-colors-0']/x:value/text()",
+                namespaces=ns),
+            ['Rouge'])
+        # Placeholders are added for missing translations.
+        self.assertEqual(
+            root_elm.xpath(
+                "//x:translation[@lang='French']"
+                "/x:text[@id='static_instance-colors-1']/x:value/text()",
+                namespaces=ns),
+            ['-'])
+
+    def test_options_interned(self):
+        survey = create_survey_element_from_dict({
+            u'type': u'survey', u'name': u'colors',
+            u'children': [
+                {u'type': u'select one', u'name': u'color%d' % i,
+                 u'label': u'Color',
+                 u'choices': [{u'name': u'red',
+                               u'label': {u'English': u'Red',
+                                          u'French': u'Rouge'}}]}
+                for i in range(2)]})
+        first, second = [question.children[0]
+                         for question in survey.children[:2]]
+        self.assertIsNot(first, second)
+        self.assertIs(first.parent, survey.children[0])
+        self.assertIs(second.parent, survey.children[1])
+        self.assertEqual(first[u'label'], second[u'label'])
+        first[u'label'][u'English'] = u'Crimson'
+        self.assertEqual(second[u'label'][u'English'], u'Red')
+        self.assertEqual(first.get_xpath(), u'/colors/color0/red')
+        self.assertEqual(second.get_xpath(), u'/colors/color1/red')
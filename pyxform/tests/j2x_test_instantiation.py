@@ -72,3 +72,38 @@ class Json2XformExportingPrepTests(TestCase):
         expected_xml = u"""<?xml version='1.0' ?><Registration id="%s"><name>bob</name></Registration>""" % \
                     (reg_xform.id_string)
         self.assertEqual(rx, expected_xml)
+
+    def test_xpath_index_matches_xml(self):
+        survey = create_survey_element_from_dict({
+            u"type": u"survey", u"name": u"nested", u"children": [
+                {u"type": u"text", u"name": u"name", u"label": u"Name"},
+                {u"type": u"group", u"name": u"g", u"label": u"G",
+                 u"children": [
+                     {u"type": u"text", u"name": u"name", u"label": u"Name"},
+                     {u"type": u"repeat", u"name": u"r", u"label": u"R",
+                      u"children": [{u"type": u"integer", u"name": u"n",
+                                     u"label": u"N"}]}]},
+                {u"type": u"group", u"name": u"f", u"label": u"F",
+                 u"flat": True,
+                 u"children": [
+                     {u"type": u"text", u"name": u"inner",
+                      u"label": u"Inner"}]}]})
+        instance = survey.instantiate()
+        self.assertEqual(instance._xpath, {
+            u"nested": u"/nested",
+            u"name": None,
+            u"g": u"/nested/g",
+            u"r": u"/nested/g/r",
+            u"n": u"/nested/g/r/n",
+            u"f": u"/nested",
+            u"inner": u"/nested/inner",
+        })
+        for element in survey.iter_descendants():
+            if instance._xpath.get(element.name):
+                self.assertEqual(instance._xpath[element.name],
+                                 element.get_xpath())
+        expected = dict(instance._xpath)
+        survey.xml()
+        self.assertEqual(survey.xpath_index(), expected)
+        instance.answer(name=u"n", value=1)
+        self.assertEqual(instance.answers(), {u"n": 1})
@@ -13,6 +13,7 @@ from __future__ import absolute_import
 
 import unittest
 import os.path
+from cStringIO import StringIO
 
 from .. import survey_from
 from .. import xform2json
@@ -142,6 +143,27 @@ class Test_ImportXForm(unittest.TestCase):
         self.assertMultiLineEqual(survey_from_path.to_xform().read(), survey_reimport.to_xform().read())
 
 
+    def test_import_stream_of_filelike_objs(self):
+        '''
+        Test that a stream of XForms is imported one survey per file-like \
+        object, the same as importing them one at a time.
+        '''
+
+        paths= [os.path.join(self.test_directory_path, 'example_xforms', f)
+                for f in ['single_select_one_survey.xml',
+                          'multiple_select_question_survey.xml']]
+        surveys= survey_from.xforms(open(p) for p in paths)
+        self.assertEqual([s['name'] for s in surveys],
+                         ['single_select_one_survey',
+                          'multiple_select_question_survey'])
+
+        builder= xform2json.XFormToDictBuilder(paths[1])
+        self.assertMultiLineEqual(builder.survey()._to_pretty_xml(),
+                                  survey_from.xform(paths[1])._to_pretty_xml())
+        # Building the survey leaves the imported dict untouched.
+        self.assertEqual(builder.survey(), builder.survey())
+
+
     def test_xform_import_warning(self):
         '''
         Test that expected warnings are generated when doing experimental 
@@ -157,6 +179,155 @@ class Test_ImportXForm(unittest.TestCase):
         self.assertIn(xform2json.NONCONFORMANCE_WARNING, warnings)
 
 
+    def test_namespaces_stripped_from_names_only(self):
+        '''
+        Test that namespaces are removed from tag and attribute names, \
+        including ones declared below the root, but not from text values.
+        '''
+
+        xform= '''<?xml version="1.0"?>
+<h:html xmlns="http://www.w3.org/2002/xforms" xmlns:h="http://www.w3.org/1999/xhtml" xmlns:jr="http://openrosa.org/javarosa">
+  <h:head>
+    <h:title>Namespaces</h:title>
+    <model>
+      <instance>
+        <namespaces id="namespaces" xmlns="http://example.org/namespaces">
+          <url/>
+        </namespaces>
+      </instance>
+      <bind nodeset="/namespaces/url" type="select1" jr:constraintMsg="Not {http://www.w3.org/2002/xforms}"/>
+    </model>
+  </h:head>
+  <h:body>
+    <select1 ref="/namespaces/url">
+      <label>Enter {http://openrosa.org/javarosa}</label>
+      <item>
+        <label>Option 1</label>
+        <value>option_1</value>
+      </item>
+    </select1>
+  </h:body>
+</h:html>'''
+
+        doc= xform2json.XFormToDictBuilder.get_dict_from_xml(
+            StringIO(xform))
+        bind= doc['html']['head']['model']['bind']
+        self.assertEqual(bind['constraintMsg'],
+                         'Not {http://www.w3.org/2002/xforms}')
+        self.assertEqual(doc['html']['body']['select1']['label'],
+                         'Enter {http://openrosa.org/javarosa}')
+
+        survey= survey_from.xform(filelike_obj=StringIO(xform))
+        self.assertEqual(survey['id_string'], 'namespaces')
+        self.assertEqual(survey['children'][0]['label'],
+                         'Enter {http://openrosa.org/javarosa}')
+
+
+    def test_group_keeps_body_position(self):
+        '''
+        Test that a group is placed where it is in the body, whatever the \
+        order of the bindings of its children.
+        '''
+
+        item= '<item><label>Yes</label><value>yes</value></item>'
+        xform= '''<?xml version="1.0"?>
+<h:html xmlns="http://www.w3.org/2002/xforms" xmlns:h="http://www.w3.org/1999/xhtml">
+  <h:head>
+    <h:title>Order</h:title>
+    <model>
+      <instance>
+        <order id="order"><g2/><x/><g><q/></g></order>
+      </instance>
+      <bind nodeset="/order/g2" type="select1"/>
+      <bind nodeset="/order/x" type="select1"/>
+      <bind nodeset="/order/g/q" type="select1"/>
+    </model>
+  </h:head>
+  <h:body>
+    <group ref="/order/g">
+      <select1 ref="/order/g/q"><label>q</label>{0}</select1>
+    </group>
+    <select1 ref="/order/g2"><label>g2</label>{0}</select1>
+    <select1 ref="/order/x"><label>x</label>{0}</select1>
+  </h:body>
+</h:html>'''.format(item)
+
+        survey= survey_from.xform(filelike_obj=StringIO(xform))
+        self.assertEqual([c['name'] for c in survey['children']],
+                         ['g', 'g2', 'x'])
+        self.assertEqual([c['name'] for c in survey['children'][0]['children']],
+                         ['q'])
+
+
+    def test_calculates_in_nested_groups(self):
+        '''
+        Test that bindings without a body element, like calculates, are \
+        placed in the nested group their nodeset is in.
+        '''
+
+        xform= '''<?xml version="1.0"?>
+<h:html xmlns="http://www.w3.org/2002/xforms" xmlns:h="http://www.w3.org/1999/xhtml">
+  <h:head>
+    <h:title>Calculates</h:title>
+    <model>
+      <instance>
+        <calcs id="calcs"><a/><outer><inner><b/><c/></inner></outer><d/></calcs>
+      </instance>
+      <bind nodeset="/calcs/a" calculate="1" type="string"/>
+      <bind nodeset="/calcs/outer/inner/b" calculate="2" type="string"/>
+      <bind nodeset="/calcs/outer/inner/c" calculate=" /calcs/outer/inner/b " type="string"/>
+      <bind nodeset="/calcs/d" calculate="3" type="string"/>
+    </model>
+  </h:head>
+  <h:body>
+    <group ref="/calcs/outer">
+      <group ref="/calcs/outer/inner"/>
+    </group>
+  </h:body>
+</h:html>'''
+
+        survey= survey_from.xform(filelike_obj=StringIO(xform))
+        self.assertEqual([c['name'] for c in survey['children']],
+                         ['a', 'outer', 'd'])
+        inner= survey['children'][1]['children'][0]
+        self.assertEqual(inner['name'], 'inner')
+        self.assertEqual([c['name'] for c in inner['children']], ['b', 'c'])
+        self.assertEqual(inner['children'][1]['bind']['calculate'], '${b}')
+
+
+    def test_body_order_preserved(self):
+        '''
+        Test that questions without a binding and groups without bound \
+        children keep their place in the body.
+        '''
+
+        item= '<item><label>Yes</label><value>yes</value></item>'
+        xform= '''<?xml version="1.0"?>
+<h:html xmlns="http://www.w3.org/2002/xforms" xmlns:h="http://www.w3.org/1999/xhtml">
+  <h:head>
+    <h:title>Body order</h:title>
+    <model>
+      <instance>
+        <body_order id="body_order"><a/><ok/><empty/><b/><c/></body_order>
+      </instance>
+      <bind nodeset="/body_order/a" type="select1"/>
+      <bind nodeset="/body_order/b" type="select1"/>
+      <bind nodeset="/body_order/c" calculate="1" type="string"/>
+    </model>
+  </h:head>
+  <h:body>
+    <select1 ref="/body_order/a"><label>a</label>{0}</select1>
+    <trigger ref="/body_order/ok"><label>ok</label></trigger>
+    <group ref="/body_order/empty"><label>empty</label></group>
+    <select1 ref="/body_order/b"><label>b</label>{0}</select1>
+  </h:body>
+</h:html>'''.format(item)
+
+        survey= survey_from.xform(filelike_obj=StringIO(xform))
+        self.assertEqual([c['name'] for c in survey['children']],
+                         ['a', 'ok', 'empty', 'b', 'c'])
+
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -15,8 +15,14 @@ from tempfile import NamedTemporaryFile
 from .. import survey_from
 from .. import constants
 from ..section import GroupedSection
+from pyxform.builder import create_survey_element_from_dict
 from pyxform import survey_to_xlsform
 
+try:
+    import openpyxl
+except ImportError:
+    openpyxl= None
+
 
 class Test_SurveyToXlsForm(unittest.TestCase):
 
@@ -38,7 +44,7 @@ class Test_SurveyToXlsForm(unittest.TestCase):
         re-imported version of it
         
         :param pyxform.survey.Survey original_survey:
-        :param str export_format: The desired intermediate file export_format. Either 'xls' (default) 'csv', or 'xform'.
+        :param str export_format: The desired intermediate file export_format. Either 'xls' (default), 'xlsx', 'csv', or 'xform'.
         :param list warnings: Optional list into which any warnings generated during import/export will be appended.
         
         :returns: An exported and re-imported version of the survey.
@@ -50,6 +56,9 @@ class Test_SurveyToXlsForm(unittest.TestCase):
             if export_format.lower() == 'xls':
                 original_survey.to_xls(xlsform_tempfile.name, warnings=warnings)
                 reimported_survey= survey_from.xls(xlsform_tempfile, warnings=warnings)
+            elif export_format.lower() == 'xlsx':
+                original_survey.to_xlsx(xlsform_tempfile.name, warnings=warnings)
+                reimported_survey= survey_from.xls(xlsform_tempfile.name, warnings=warnings)
             elif export_format.lower() == 'csv':
                 original_survey.to_csv(xlsform_tempfile.name, warnings=warnings)
                 reimported_survey= survey_from.csv(xlsform_tempfile, warnings=warnings)
@@ -76,6 +85,31 @@ class Test_SurveyToXlsForm(unittest.TestCase):
             self.assertEqual(xls_survey, csv_survey, 'XLS and CSV XLSForm mismatch for "{}".'.format(xform_in_p))
 
 
+    @unittest.skipIf(openpyxl is None, 'Exporting to XLSX requires "openpyxl".')
+    def test_consistent_xlsx_export(self):
+        '''
+        Test that exporting a form to XLSX and XLS results in the same data.
+        '''
+
+        labels= lambda text: {'English': text, 'French': text + u' \u00e9'}
+        survey= create_survey_element_from_dict({
+            'type': 'survey', 'name': 'xlsx', 'id_string': 'xlsx', 'title': 'XLSX',
+            'children': [
+                {'type': 'text', 'name': 'name', 'label': labels('Name')},
+                {'type': 'select one', 'name': 'color', 'label': labels('Color'),
+                 'choices': [{'name': 'red', 'label': labels('Red')}, {'name': 'blue', 'label': labels('Blue')}]},
+                {'type': 'integer', 'name': 'age', 'label': labels('Age'), 'bind': {'required': 'true()'}},
+            ],
+        })
+
+        xls_survey= self._export_and_reimport(survey, 'xls')
+
+        xlsx_survey= self._export_and_reimport(survey, 'xlsx')
+
+        self.assertEqual(xls_survey, xlsx_survey)
+        self.assertEqual(xlsx_survey[constants.CHILDREN][1][constants.LABEL], labels('Color'))
+
+
     def test_unicode(self):
         '''
         Test that Unicode text is correctly exported and re-importable.
@@ -290,6 +324,115 @@ class Test_SurveyToXlsForm(unittest.TestCase):
             self.assertMultiLineEqual(original_survey_file.read(), survey_csv_reimported.to_xform().read())
 
 
+    def test_column_registry(self):
+        '''
+        Test that the column registry keeps its column order and indices in step.
+        '''
+
+        columns= survey_to_xlsform.ColumnRegistry(['name', 'type'])
+        row= columns.new_row()
+        survey_to_xlsform.XlsFormExporter.insert_dict_into_row(
+            {'type': 'text', 'label::English': 'Name'}, row, columns)
+        self.assertEqual(columns, ['name', 'type', 'label::English'])
+        self.assertEqual(row, ['', 'text', 'Name'])
+        self.assertIn('label::English', columns)
+        self.assertEqual(columns.index('label::English'), 2)
+
+        columns[2]= 'label'
+        self.assertNotIn('label::English', columns)
+        self.assertEqual(columns.index('label'), 2)
+        self.assertRaises(ValueError, columns.index, 'label::English')
+        self.assertEqual(columns.new_row(), ['', '', ''])
+
+
+    def test_shared_choice_lists(self):
+        '''
+        Test that identical choice lists are exported once, under a deterministic name.
+        '''
+
+        choices= [{'name': 'yes', 'label': 'Yes'}, {'name': 'no', 'label': 'No'}]
+        survey= create_survey_element_from_dict({
+            'type': 'survey', 'name': 'shared', 'id_string': 'shared',
+            'children': [
+                {'type': 'select one', 'name': 'q1', 'label': 'Q1', 'choices': choices},
+                {'type': 'select all that apply', 'name': 'q2', 'label': 'Q2', 'choices': choices},
+                {'type': 'select one', 'name': 'q3', 'label': 'Q3', 'choices': choices[:1]},
+            ],
+        })
+        sheet_dict= survey_to_xlsform.XlsFormExporter(survey).sheet_dict
+
+        survey_columns= sheet_dict[constants.SURVEY][0]
+        question_types= [row[survey_columns.index(constants.TYPE)] for row in sheet_dict[constants.SURVEY][1:]]
+        list_names= [question_type.split()[-1] for question_type in question_types]
+        self.assertEqual(list_names[0], list_names[1])
+        self.assertNotEqual(list_names[0], list_names[2])
+        self.assertEqual(list_names[0], 'q1')
+
+        choices_columns= sheet_dict[constants.CHOICES][0]
+        choice_list_names= [row[choices_columns.index(constants.LIST_NAME)] for row in sheet_dict[constants.CHOICES][1:]]
+        self.assertEqual(choice_list_names, [list_names[0], list_names[0], list_names[2]])
+
+        self.assertEqual(survey.to_csv().read(), survey.to_csv().read())
+
+
+    def test_choices_spill_to_file(self):
+        '''
+        Test that spilling the 'choices' sheet to a temporary file doesn't change the export.
+        '''
+
+        survey= create_survey_element_from_dict({
+            'type': 'survey', 'name': 'spill', 'id_string': 'spill',
+            'children': [
+                {'type': 'select one', 'name': 'q%d' % i, 'label': 'Q%d' % i,
+                 'choices': [{'name': 'c%d' % c, 'label': {'English': 'C%d.%d' % (i, c)}} for c in range(10)]}
+                for i in range(5)
+            ],
+        })
+        in_memory= survey_to_xlsform.XlsFormExporter(survey).sheet_dict
+        spilled_exporter= survey_to_xlsform.XlsFormExporter(survey, spill_threshold=3)
+        sheets= spilled_exporter.iter_sheets()
+        sheet_name, survey_rows= next(sheets)
+        self.assertEqual(sheet_name, constants.SETTINGS)
+        sheet_name, survey_rows= next(sheets)
+        self.assertEqual(sheet_name, constants.SURVEY)
+        self.assertEqual(list(survey_rows), in_memory[constants.SURVEY])
+        self.assertEqual(len(spilled_exporter.choices_sheet_rows), 50)
+        self.assertEqual(len(spilled_exporter.choices_sheet_rows.rows), 2)
+        sheet_name, choices_rows= next(sheets)
+        self.assertEqual(list(choices_rows), in_memory[constants.CHOICES])
+        self.assertEqual(in_memory[constants.CHOICES][0], [constants.LIST_NAME, constants.NAME, 'label::English'])
+
+
+    def test_single_traversal(self):
+        '''
+        Test that the survey is traversed once, and that rows recorded before a 
+        later column was registered are padded to the full header.
+        '''
+
+        survey= create_survey_element_from_dict({
+            'type': 'survey', 'name': 'late', 'id_string': 'late',
+            'children': [
+                {'type': 'text', 'name': 'q1', 'label': {'English': 'Q1'}},
+                {'type': 'text', 'name': 'q2', 'label': {'French': 'Q2'}},
+            ],
+        })
+        exporter= survey_to_xlsform.XlsFormExporter(survey)
+        recorded= list()
+        record_question_data= exporter.record_question_data
+        def counted_record_question_data(question):
+            recorded.append(question[constants.NAME])
+            return record_question_data(question)
+        exporter.record_question_data= counted_record_question_data
+        sheet_dict= exporter.sheet_dict
+
+        self.assertEqual(recorded, ['q1', 'q2'])
+        self.assertEqual(sheet_dict[constants.SURVEY], [
+            [constants.NAME, constants.TYPE, 'label::English', 'label::French'],
+            ['q1', 'text', 'Q1', ''],
+            ['q2', 'text', '', 'Q2'],
+        ])
+
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
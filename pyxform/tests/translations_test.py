@@ -0,0 +1,44 @@
+"""
+Testing the table used to build the itext block.
+"""
+from unittest import TestCase
+from pyxform.translations import TranslationTable
+
+
+class TranslationTableTest(TestCase):
+
+    def test_iteration_is_sorted(self):
+        table = TranslationTable()
+        table.add(u"French", u"/b:label", u"long", u"B fr")
+        table.add(u"English", u"/b:label", u"long", u"B")
+        table.add(u"English", u"/b:label", u"image", u"b.png")
+        table.add(u"English", u"/a:label", u"long", u"A")
+        self.assertEqual(table.languages(), [u"English", u"French"])
+        self.assertEqual(
+            list(table.iter_translations(u"English")),
+            [(u"/a:label", [(u"long", u"A")]),
+             (u"/b:label", [(u"image", u"b.png"), (u"long", u"B")])])
+
+    def test_values_are_interned(self):
+        table = TranslationTable()
+        table.add(u"English", u"/a:label", u"image", u"a.png")
+        table.add(u"French", u"/a:label", u"image", u"a.png")
+        table.add(u"French", u"/a:label", u"image", u"a_fr.png")
+        self.assertEqual(list(table.iter_translations(u"French")),
+                         [(u"/a:label", [(u"image", u"a_fr.png")])])
+        self.assertEqual(len(table._values), 2)
+
+    def test_add_empty_translations(self):
+        table = TranslationTable()
+        table.add(u"English", u"/a:label", u"long", u"A")
+        table.add(u"English", u"/a:label", u"audio", u"a.mp3")
+        table.add(u"French", u"/b:label", u"long", u"B fr")
+        table.add_empty_translations(u"-")
+        self.assertEqual(
+            list(table.iter_translations(u"English")),
+            [(u"/a:label", [(u"audio", u"a.mp3"), (u"long", u"A")]),
+             (u"/b:label", [(u"long", u"-")])])
+        self.assertEqual(
+            list(table.iter_translations(u"French")),
+            [(u"/a:label", [(u"audio", u"-"), (u"long", u"-")]),
+             (u"/b:label", [(u"long", u"B fr")])])
@@ -0,0 +1,120 @@
+"""
+Test the submission parsers in xform_instance_parser.
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from cStringIO import StringIO
+
+from pyxform.xform_instance_parser import XFORM_ID_STRING, \
+    XFormInstanceIterParser, parse_xform_instance, iterparse_xform_instance, \
+    parse_xform_instances, xform_instance_to_dict
+
+SUBMISSION = """
+<?xml version='1.0' ?>
+<household id="household" version="2" xmlns:orx="http://openrosa.org/xforms">
+  <name>  Smith  </name>
+  <empty/>
+  <blank>   </blank>
+  <member>
+    <first_name>Ann</first_name>
+    <phone>1</phone>
+  </member>
+  <member>
+    <first_name>Bob</first_name>
+    <phone>2</phone>
+    <phone>3</phone>
+  </member>
+  <pet><kind>cat</kind></pet>
+  <orx:meta>
+    <orx:instanceID>uuid:1</orx:instanceID>
+  </orx:meta>
+</household>
+"""
+
+
+class XFormInstanceIterParserTests(TestCase):
+
+    def test_flat_dict(self):
+        self.assertEqual(iterparse_xform_instance(SUBMISSION), {
+            u"name": u"  Smith  ",
+            u"empty": None,
+            u"blank": None,
+            u"member[1]/first_name": u"Ann",
+            u"member[1]/phone": u"1",
+            u"member[2]/first_name": u"Bob",
+            u"member[2]/phone[1]": u"2",
+            u"member[2]/phone[2]": u"3",
+            u"pet/kind": u"cat",
+            u"orx:meta/orx:instanceID": u"uuid:1",
+            XFORM_ID_STRING: u"household",
+        })
+
+    def test_attributes(self):
+        parser = XFormInstanceIterParser(SUBMISSION)
+        self.assertEqual(parser.get_root_node_name(), u"household")
+        self.assertEqual(parser.get_attributes(), {
+            u"id": u"household",
+            u"version": u"2",
+            u"xmlns:orx": u"http://openrosa.org/xforms",
+        })
+
+    def test_same_as_dom_parser(self):
+        self.assertEqual(iterparse_xform_instance(SUBMISSION),
+                         parse_xform_instance(SUBMISSION))
+
+    def test_json_dict_same_as_dom_parser(self):
+        for submission in [SUBMISSION, "<leaf>text</leaf>", "<empty/>"]:
+            self.assertEqual(
+                XFormInstanceIterParser(submission).to_json_dict(),
+                xform_instance_to_dict(submission))
+
+    def test_xml_namespace_attributes(self):
+        submission = '<d id="x"><a xml:lang="en">1</a></d>'
+        parser = XFormInstanceIterParser(submission)
+        self.assertEqual(parser.get_attributes(),
+                         {u"id": u"x", u"xml:lang": u"en"})
+        self.assertEqual(iterparse_xform_instance(submission),
+                         parse_xform_instance(submission))
+        self.assertEqual(
+            list(parse_xform_instances([submission], processes=1)),
+            [parse_xform_instance(submission)])
+
+    def test_filelike_obj(self):
+        parser = XFormInstanceIterParser(StringIO(SUBMISSION.strip()))
+        self.assertEqual(parser.get(u"member[2]/phone[2]"), u"3")
+
+
+class ParseXFormInstancesTests(TestCase):
+
+    def setUp(self):
+        self.submissions = [SUBMISSION.replace("Smith", "Smith %d" % i)
+                            for i in range(10)]
+        self.expected = [parse_xform_instance(s) for s in self.submissions]
+
+    def test_ordered(self):
+        for processes in [1, 2]:
+            results = parse_xform_instances(
+                iter(self.submissions), processes=processes, chunksize=3)
+            self.assertEqual(list(results), self.expected)
+
+    def test_unordered_with_ids(self):
+        for processes in [1, 2]:
+            results = parse_xform_instances(
+                self.submissions, processes=processes, chunksize=3,
+                ordered=False)
+            self.assertEqual(sorted(results), list(enumerate(self.expected)))
+
+    def test_file_paths(self):
+        directory = tempfile.mkdtemp()
+        try:
+            paths = []
+            for i, submission in enumerate(self.submissions):
+                paths.append(os.path.join(directory, "%d.xml" % i))
+                with open(paths[-1], "w") as f:
+                    f.write(submission.strip())
+            results = parse_xform_instances(paths, processes=2)
+            self.assertEqual(list(results), self.expected)
+        finally:
+            shutil.rmtree(directory)
@@ -2,7 +2,8 @@
 Testing simple cases for Xls2Json
 """
 from unittest2 import TestCase
-from pyxform.xls2json import SurveyReader
+from pyxform.xls2json import SurveyReader, workbook_to_json
+from pyxform import constants
 import utils
 import os
 import json, codecs
@@ -209,3 +210,102 @@ class UnicodeCsvTest(TestCase):
         dict_value = csv_to_dict(utf_csv_path)
         self.assertTrue("\ud83c" in json.dumps(dict_value))
 
+
+
+class ChoicesSheetTest(TestCase):
+
+    def _workbook(self, choices):
+        return {
+            u"survey": [
+                {u"type": u"select one colors", u"name": u"color",
+                 u"label": u"Color"},
+            ],
+            u"choices": choices,
+        }
+
+    def test_choices_grouped_by_list_name(self):
+        workbook = self._workbook([
+            {u"list name": u"colors", u"name": u"red", u"label": u"Red"},
+            {u"list name": u"sizes", u"name": u"big", u"label": u"Big"},
+            {u"list name": u"colors", u"name": u"blue", u"label": u"Blue"},
+        ])
+        survey = workbook_to_json(workbook)
+        self.assertEqual(
+            [c[u"name"] for c in survey[u"children"][0][u"choices"]],
+            [u"red", u"blue"])
+
+    def test_illegal_header_warned_once(self):
+        warnings = []
+        workbook = self._workbook([
+            {u"list name": u"colors", u"name": u"red", u"label": u"Red",
+             u"bad header": u"x"},
+            {u"list name": u"colors", u"name": u"blue", u"label": u"Blue",
+             u"bad header": u"y"},
+        ])
+        survey = workbook_to_json(workbook, warnings=warnings)
+        self.assertEqual(len(warnings), 1)
+        for choice in survey[u"children"][0][u"choices"]:
+            self.assertNotIn(u"bad header", choice)
+
+    def test_duplicate_choice_names_warned(self):
+        warnings = []
+        workbook = self._workbook([
+            {u"list name": u"colors", u"name": u"red", u"label": u"Red"},
+            {u"list name": u"colors", u"name": u"red", u"label": u"Rouge"},
+        ])
+        workbook_to_json(workbook, warnings=warnings)
+        self.assertEqual(len(warnings), 1)
+        self.assertIn(u"[red]", warnings[0])
+
+    def test_choice_list_shared_above_threshold(self):
+        workbook = self._workbook([
+            {u"list name": u"colors", u"name": u"red", u"label": u"Red"},
+        ])
+        workbook[u"survey"].append(
+            {u"type": u"select one colors", u"name": u"color2",
+             u"label": u"Color"})
+        workbook[u"settings"] = [{u"shared_choices_threshold": u"2"}]
+        survey = workbook_to_json(workbook)
+        self.assertEqual(survey[u"choices"].keys(), [u"colors"])
+        for question in survey[u"children"][:2]:
+            self.assertEqual(question[u"itemset"], u"colors")
+            self.assertNotIn(u"choices", question)
+
+    def test_choice_list_not_shared_below_threshold(self):
+        workbook = self._workbook([
+            {u"list name": u"colors", u"name": u"red", u"label": u"Red"},
+        ])
+        survey = workbook_to_json(workbook)
+        self.assertNotIn(u"choices", survey)
+        self.assertNotIn(u"itemset", survey[u"children"][0])
+
+    def _workbook_with_selects(self, count):
+        workbook = self._workbook([
+            {u"list name": u"colors", u"name": u"red", u"label": u"Red"},
+        ])
+        workbook[u"survey"] = [
+            {u"type": u"select one colors", u"name": u"color%d" % i,
+             u"label": u"Color"} for i in range(count)]
+        return workbook
+
+    def test_choice_lists_shared_at_default_threshold(self):
+        count = constants.DEFAULT_SHARED_CHOICES_THRESHOLD
+        survey = workbook_to_json(self._workbook_with_selects(count))
+        self.assertEqual(survey[u"choices"].keys(), [u"colors"])
+        for question in survey[u"children"][:count]:
+            self.assertEqual(question[u"itemset"], u"colors")
+
+    def test_choice_lists_not_shared_below_default_threshold(self):
+        count = constants.DEFAULT_SHARED_CHOICES_THRESHOLD - 1
+        survey = workbook_to_json(self._workbook_with_selects(count))
+        self.assertNotIn(u"choices", survey)
+        for question in survey[u"children"][:count]:
+            self.assertNotIn(u"itemset", question)
+            self.assertEqual(question[u"choices"],
+                             [{u"name": u"red", u"label": u"Red"}])
+
+    def test_choice_list_sharing_disabled(self):
+        workbook = self._workbook_with_selects(50)
+        workbook[u"settings"] = [{u"shared_choices_threshold": u"0"}]
+        survey = workbook_to_json(workbook)
+        self.assertNotIn(u"choices", survey)
@@ -0,0 +1,140 @@
+"""
+A table of the itext translations of a survey.
+@see survey.Survey.itext
+"""
+from array import array
+
+MISSING = -1
+
+
+class TranslationTable(object):
+    """
+    A columnar store of the translations that end up in the itext block.
+    Each cell is addressed by (language, path, form) where path is the itext
+    id (e.g. /survey/question:label) and form is "long" for text or the media
+    type. Languages and paths are interned to integer ids: rows are path ids
+    and there is one column per (language id, form) pair.
+    Values are interned too, so a column is a compact array of value ids
+    (MISSING where there is no value) and identical strings, like the "-"
+    placeholder or media file names shared across languages, are only
+    stored once.
+    Each column also keeps the set of the rows it has values for, updated as
+    cells are added, so the cells missing from a language are found for
+    every path at once with set operations.
+    Languages, paths and forms are iterated in sorted order so the output
+    doesn't depend on the order the translations were added in.
+    """
+
+    def __init__(self):
+        self._languages = []
+        self._language_ids = {}
+        self._forms = []
+        self._paths = []
+        self._path_ids = {}
+        self._sorted_path_ids = None
+        self._values = []
+        self._value_ids = {}
+        self._columns = {}
+        self._present_rows = {}
+
+    def __len__(self):
+        return len(self._languages)
+
+    def languages(self):
+        return sorted(self._languages)
+
+    def _get_language_id(self, language):
+        language_id = self._language_ids.get(language)
+        if language_id is None:
+            language_id = self._language_ids[language] = len(self._languages)
+            self._languages.append(language)
+        return language_id
+
+    def _get_path_id(self, path):
+        path_id = self._path_ids.get(path)
+        if path_id is None:
+            path_id = self._path_ids[path] = len(self._paths)
+            self._paths.append(path)
+            self._sorted_path_ids = None
+        return path_id
+
+    def _get_value_id(self, value):
+        key = (type(value), value)
+        value_id = self._value_ids.get(key)
+        if value_id is None:
+            value_id = self._value_ids[key] = len(self._values)
+            self._values.append(value)
+        return value_id
+
+    def _get_column(self, language_id, form):
+        key = (language_id, form)
+        column = self._columns.get(key)
+        if column is None:
+            if form not in self._forms:
+                self._forms.append(form)
+                self._forms.sort()
+            column = self._columns[key] = array("l")
+            self._present_rows[key] = set()
+        return column
+
+    @staticmethod
+    def _extend_column(column, length):
+        if len(column) < length:
+            column.extend(array("l", [MISSING]) * (length - len(column)))
+
+    def _iter_path_ids(self):
+        if self._sorted_path_ids is None:
+            self._sorted_path_ids = sorted(
+                xrange(len(self._paths)), key=self._paths.__getitem__)
+        return self._sorted_path_ids
+
+    def add(self, language, path, form, value):
+        """
+        Set the value of a cell, replacing any previous value.
+        """
+        path_id = self._get_path_id(path)
+        language_id = self._get_language_id(language)
+        column = self._get_column(language_id, form)
+        self._extend_column(column, path_id + 1)
+        column[path_id] = self._get_value_id(value)
+        self._present_rows[(language_id, form)].add(path_id)
+
+    def add_empty_translations(self, placeholder=u"-"):
+        """
+        Fill in the placeholder for every (path, form) cell that has a value
+        in some language but not in the others, so that every itext element
+        has the same forms across every language.
+        """
+        placeholder_id = self._get_value_id(placeholder)
+        language_ids = range(len(self._languages))
+        for form in self._forms:
+            present = [self._present_rows.get((language_id, form), ())
+                       for language_id in language_ids]
+            union = set().union(*present)
+            for language_id, rows in zip(language_ids, present):
+                missing = union.difference(rows)
+                if not missing:
+                    continue
+                column = self._get_column(language_id, form)
+                self._extend_column(column, len(self._paths))
+                for path_id in missing:
+                    column[path_id] = placeholder_id
+                self._present_rows[(language_id, form)].update(missing)
+
+    def iter_translations(self, language):
+        """
+        Yield (path, [(form, value), ...]) for every path that has at least
+        one value in the given language.
+        """
+        language_id = self._language_ids[language]
+        columns = [(form, self._columns[(language_id, form)])
+                   for form in self._forms
+                   if (language_id, form) in self._columns]
+        values = self._values
+        for path_id in self._iter_path_ids():
+            content = [(form, values[column[path_id]])
+                       for form, column in columns
+                       if path_id < len(column) and
+                       column[path_id] != MISSING]
+            if content:
+                yield self._paths[path_id], content
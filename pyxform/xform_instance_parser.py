@@ -4,8 +4,13 @@
 # where this code is actually going to live.
 
 from xml.dom import minidom
+from cStringIO import StringIO
+from itertools import islice
+import multiprocessing
 import re
 
+from lxml import etree
+
 XFORM_ID_STRING = u"_xform_id_string"
 
 def _xml_node_to_dict(node):
@@ -63,6 +68,41 @@ def _flatten_dict(d, prefix):
         else:
             yield (new_prefix, value)
 
+# A step of a flattened xpath with its index among same-named siblings.
+_INDEXED_STEP = re.compile(ur"^(.+)\[(\d+)\]$")
+
+def _unflatten_dict(flat_dict):
+    """
+    Return the value of the root node that _flatten_dict flattened into
+    flat_dict, whose keys are the xpaths below the root.
+    """
+    if u"" in flat_dict:
+        # the root node is a leaf
+        return flat_dict[u""]
+    result = {}
+    for xpath, value in flat_dict.items():
+        parent = result
+        steps = xpath.split(u"/")
+        for step_number, step in enumerate(steps, 1):
+            match = _INDEXED_STEP.match(step)
+            if match is None:
+                if step_number == len(steps):
+                    parent[step] = value
+                else:
+                    parent = parent.setdefault(step, {})
+                continue
+            items = parent.setdefault(match.group(1), [])
+            index = int(match.group(2)) - 1
+            if len(items) <= index:
+                items.extend([None] * (index + 1 - len(items)))
+            if step_number == len(steps):
+                items[index] = value
+            else:
+                if items[index] is None:
+                    items[index] = {}
+                parent = items[index]
+    return result
+
 def _get_all_attributes(node):
     """
     Go through an XML document returning all the attributes we see.
@@ -118,10 +158,116 @@ class XFormInstanceParser(object):
 
     def get_flat_dict_with_attributes(self):
         result = self.to_flat_dict().copy()
-        result[XFORM_ID_STRING] = self.get_xform_id_string
+        result[XFORM_ID_STRING] = self.get_xform_id_string()
         return result
 
 
+def _iterparse_instance(source):
+    """
+    Parse an instance in a single pass with iterparse, freeing elements as
+    soon as they have been read. Return the root node name, the flat dict
+    and the attributes, as XFormInstanceParser does.
+
+    Each element gets a one item list holding its name in the xpath. When a
+    second sibling with the same name turns up the first one's name is
+    changed in place to name[1], so the xpaths of the values already read
+    below it pick up the index when they are joined at the end.
+    """
+    values = []
+    attributes = {}
+    # The xml prefix is bound without being declared.
+    prefixes = {u"http://www.w3.org/XML/1998/namespace": u"xml"}
+    # One [name cell, {child name: [count, first child's name cell]},
+    # has child elements] per open element.
+    stack = []
+    cells = []
+    events = etree.iterparse(
+        source, events=("start-ns", "start", "end"), remove_comments=True)
+    for event, item in events:
+        if event == "start":
+            tag = item.tag
+            if tag[0] == "{":
+                tag = tag[tag.index("}") + 1:]
+            if item.prefix:
+                tag = u"%s:%s" % (item.prefix, tag)
+            else:
+                tag = unicode(tag)
+            if stack:
+                parent = stack[-1]
+                parent[2] = True
+                sibling = parent[1].get(tag)
+                if sibling is None:
+                    cell = [tag]
+                    parent[1][tag] = [1, cell]
+                else:
+                    sibling[0] += 1
+                    if sibling[0] == 2:
+                        sibling[1][0] = u"%s[1]" % tag
+                    cell = [u"%s[%d]" % (tag, sibling[0])]
+                cells.append(cell)
+            else:
+                cell = root_cell = [tag]
+            stack.append([cell, {}, False])
+            for key, value in item.items():
+                if key[0] == "{":
+                    uri, key = key[1:].split("}", 1)
+                    key = u"%s:%s" % (prefixes[uri], key)
+                assert key not in attributes
+                attributes[key] = unicode(value)
+        elif event == "end":
+            if not stack.pop()[2]:
+                text = item.text
+                if text is not None and text.strip():
+                    text = unicode(text)
+                else:
+                    text = None
+                values.append((tuple(cells), text))
+            if cells:
+                cells.pop()
+            item.clear()
+            while item.getprevious() is not None:
+                del item.getparent()[0]
+        else:
+            prefix, uri = item
+            prefixes[uri] = prefix
+            key = u"xmlns:%s" % prefix if prefix else u"xmlns"
+            assert key not in attributes
+            attributes[key] = unicode(uri)
+    flat_dict = dict((u"/".join([cell[0] for cell in path]), value)
+                     for path, value in values)
+    return root_cell[0], flat_dict, attributes
+
+
+class XFormInstanceIterParser(XFormInstanceParser):
+    """
+    A streaming XFormInstanceParser for large volumes of submissions. It reads
+    the flat dict, repeat indices and attributes in a single iterparse pass,
+    without building a DOM or the nested dict. to_json_dict rebuilds the
+    nested dict from the flat dict when it is first called.
+    xml_str may also be a file-like object.
+    The results are the same as XFormInstanceParser's for submissions,
+    which don't mix text and elements or use CDATA sections.
+    """
+
+    def parse(self, xml_str):
+        if isinstance(xml_str, basestring):
+            if isinstance(xml_str, unicode):
+                xml_str = xml_str.encode("utf-8")
+            xml_str = StringIO(xml_str.strip())
+        self._root_node_name, self._flat_dict, self._attributes = \
+            _iterparse_instance(xml_str)
+        self._dict = None
+
+    def get_root_node_name(self):
+        return self._root_node_name
+
+    def to_json_dict(self):
+        if self._dict is None:
+            self._dict = {
+                self._root_node_name: _unflatten_dict(self._flat_dict)}
+        return self._dict
+
+
 def xform_instance_to_dict(xml_str):
     parser = XFormInstanceParser(xml_str)
     return parser.to_json_dict()
@@ -133,3 +279,58 @@ def xform_instance_to_flat_dict(xml_str):
 def parse_xform_instance(xml_str):
     parser = XFormInstanceParser(xml_str)
     return parser.get_flat_dict_with_attributes()
+
+def iterparse_xform_instance(xml_str):
+    parser = XFormInstanceIterParser(xml_str)
+    return parser.get_flat_dict_with_attributes()
+
+def _parse_submission(submission):
+    """
+    Parse a submission given as an XML string or the path of an XML file.
+    """
+    if submission.lstrip()[:1] == "<":
+        return iterparse_xform_instance(submission)
+    with open(submission, "rb") as f:
+        return iterparse_xform_instance(f)
+
+def _parse_numbered_submission(numbered_submission):
+    number, submission = numbered_submission
+    return number, _parse_submission(submission)
+
+def parse_xform_instances(submissions, processes=None, chunksize=64,
+                          ordered=True):
+    """
+    Parse an iterable of submissions, each an XML string or the path of an
+    XML file, across a pool of processes (cpu count by default, 1 parses in
+    this process). Submissions are sent to the workers in chunks of
+    chunksize and read from the iterable a window of chunks at a time, so
+    memory stays bounded however many there are.
+    Yield what parse_xform_instance returns for each submission, in order,
+    or (position in submissions, result) pairs as soon as they are parsed if
+    ordered is False.
+    """
+    if processes == 1:
+        for number, submission in enumerate(submissions):
+            result = _parse_submission(submission)
+            yield result if ordered else (number, result)
+        return
+    processes = processes or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes)
+    window = chunksize * processes * 4
+    numbered_submissions = enumerate(submissions)
+    try:
+        while True:
+            batch = list(islice(numbered_submissions, window))
+            if not batch:
+                break
+            if ordered:
+                results = pool.imap(
+                    _parse_submission, [s for n, s in batch], chunksize)
+            else:
+                results = pool.imap_unordered(
+                    _parse_numbered_submission, batch, chunksize)
+            for result in results:
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()
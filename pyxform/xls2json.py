@@ -190,6 +190,77 @@ def group_dictionaries_by_key(list_of_dicts, key, remove_key=True):
     return dict_of_lists
 
 
+def group_choices_by_list_name(choices_sheets, warnings):
+    """
+    Takes a list of (dealiased) choices sheets and returns a dictionary
+    of lists of choices keyed by list name, validating the choices as
+    they are grouped. This is done in a single pass over all the rows:
+    - Each column header is only checked once, the result is cached
+      and columns with illegal headers are removed from every choice.
+    - Duplicate choice names are detected per list with a set of the
+      names seen so far.
+    Rows without a list name are skipped.
+    """
+    choices = dict()
+    names_by_list = dict()
+    header_is_legal = dict()
+    for sheet in choices_sheets:
+        for option in sheet:
+            if constants.LIST_NAME not in option:
+                continue
+            list_name = option.pop(constants.LIST_NAME)
+            if list_name in choices:
+                options = choices[list_name]
+                names = names_by_list[list_name]
+            else:
+                options = choices[list_name] = []
+                names = names_by_list[list_name] = set()
+            options.append(option)
+
+            if constants.NAME not in option:
+                info = "[list_name : " + list_name + ']'
+                raise PyXFormError("On the choices sheet there is "
+                                   "a option with no name. " + info)
+            if 'label' not in option:
+                info = "[list_name : " + list_name + ']'
+                warnings.append(
+                    "On the choices sheet there is a option with no label. "
+                    + info)
+
+            name = option[constants.NAME]
+            if name in names:
+                warnings.append(
+                    "On the choices sheet the list [" + list_name +
+                    "] has more than one option named [" +
+                    unicode(name) + "].")
+            else:
+                names.add(name)
+
+            # chrislrobert's fix for a cryptic error message:
+            # see: https://code.google.com/p/opendatakit/issues/detail?id=833&start=200
+            for headername in option.keys():
+                legal = header_is_legal.get(headername)
+                if legal is None:
+                    # Using warnings and removing the bad columns
+                    # instead of throwing errors because some forms
+                    # use choices column headers for notes.
+                    legal = header_is_legal[headername] = \
+                        headername != '' and ' ' not in headername
+                    if headername == '':
+                        warnings.append(
+                            "On the choices sheet there is a value" +
+                            " in a column with no header.")
+                    elif not legal:
+                        warnings.append("On the choices sheet there is " +
+                                        "a column (\"" +
+                                        headername +
+                                        "\") with an illegal header. " +
+                                        "Headers cannot include spaces.")
+                if not legal:
+                    del option[headername]
+    return choices
+
+
 def has_double_colon(workbook_dict):
     """
     Look for a column header with a doublecolon (::) and
@@ -240,6 +311,25 @@ def add_flat_annotations(prompt_list, parent_relevant = '', name_prefix = ''):
             #    prompt['name'] = name_prefix + prompt['name']
 
 
+def share_choice_lists(json_dict, choices, selects_by_list_name, threshold):
+    """
+    Make the select questions that use a choice list at least threshold
+    times reference it through an itemset instead of each carrying their
+    own copy of the choices. The shared lists are added to the survey's
+    choices so they get emitted once as secondary instances.
+    selects_by_list_name -- a dict of lists of select question json dicts
+                            keyed by the name of the choice list they use
+    """
+    for list_name, selects in selects_by_list_name.items():
+        if len(selects) < threshold:
+            continue
+        survey_choices = json_dict.setdefault(constants.CHOICES, {})
+        survey_choices[list_name] = choices[list_name]
+        for select in selects:
+            del select[constants.CHOICES]
+            select[constants.ITEMSET_XFORM] = list_name
+
+
 def workbook_to_json(
         workbook_dict, form_name=None,
         default_language=u"default", warnings=None):
@@ -361,47 +451,17 @@ def workbook_to_json(
         default_language)
     ########### Cascading Select sheet ###########
     cascading_choices = workbook_dict.get(constants.CASCADING_CHOICES, [])
+    cascading_choices_sheet = []
     if len(cascading_choices):
         if 'choices' in cascading_choices[0]:
-            choices_sheet = choices_sheet + cascading_choices[0]['choices']
-
-    combined_lists = group_dictionaries_by_key(
-        choices_and_columns_sheet + choices_sheet + columns_sheet,
-        constants.LIST_NAME)
-
-    choices = combined_lists
-    #Make sure all the options have the required properties:
-    warnedabout = set()
-    for list_name, options in choices.items():
-        for option in options:
-            if constants.NAME not in option:
-                info = "[list_name : " + list_name + ']'
-                raise PyXFormError("On the choices sheet there is "
-                                   "a option with no name. " + info)
-            if 'label' not in option:
-                info = "[list_name : " + list_name + ']'
-                warnings.append(
-                    "On the choices sheet there is a option with no label. "
-                    + info)
-            # chrislrobert's fix for a cryptic error message:
-            # see: https://code.google.com/p/opendatakit/issues/detail?id=833&start=200
-            for headername in option.keys():
-                # Using warnings and removing the bad columns
-                # instead of throwing errors because some forms
-                # use choices column headers for notes.
-                if ' ' in headername:
-                    if headername not in warnedabout:
-                        warnedabout.add(headername)
-                        warnings.append("On the choices sheet there is " +
-                                        "a column (\"" +
-                                        headername +
-                                        "\") with an illegal header. " +
-                                        "Headers cannot include spaces.")
-                    del option[headername]
-                elif headername == '':
-                    warnings.append("On the choices sheet there is a value" +
-                                    " in a column with no header.")
-                    del option[headername]
+            cascading_choices_sheet = cascading_choices[0]['choices']
+
+    #Group the options by list name making sure they all have
+    #the required properties:
+    choices = group_choices_by_list_name(
+        [choices_and_columns_sheet, choices_sheet,
+         cascading_choices_sheet, columns_sheet],
+        warnings)
     ########### Survey sheet ###########
     if constants.SURVEY not in workbook_dict:
         raise PyXFormError(
@@ -443,6 +503,8 @@ def workbook_to_json(
         r"^(?P<cascading_command>("
         + '|'.join(aliases.cascading.keys())
         + r")) (?P<cascading_level>\S+)?$")
+    #Select questions that could use a shared choice list, by list name.
+    shareable_selects = dict()
     for row in survey_sheet:
         row_number += 1
         prev_control_type, parent_children_array = stack[-1]
@@ -732,6 +794,10 @@ def workbook_to_json(
                         json_dict[constants.CHOICES] = choices
                 else:
                     new_json_dict[constants.CHOICES] = choices[list_name]
+                    if table_list is None and \
+                       parse_dict.get("specify_other") is None:
+                        shareable_selects.setdefault(list_name, []).append(
+                            new_json_dict)
 
                 #Code to deal with table_list appearance flags
                 #(for groups of selects)
@@ -774,6 +840,20 @@ def workbook_to_json(
     if len(stack) != 1:
         raise PyXFormError("Unmatched begin statement: " + str(stack[-1][0]))
 
+    shared_choices_threshold = settings.get(
+        constants.SHARED_CHOICES_THRESHOLD,
+        constants.DEFAULT_SHARED_CHOICES_THRESHOLD)
+    try:
+        shared_choices_threshold = int(float(shared_choices_threshold))
+    except ValueError:
+        raise PyXFormError(
+            "The " + constants.SHARED_CHOICES_THRESHOLD +
+            " setting must be a number.")
+    if shared_choices_threshold > 0 and \
+       not settings.get(u"add_none_option", False):
+        share_choice_lists(
+            json_dict, choices, shareable_selects, shared_choices_threshold)
+
 
     if settings.get('flat', False):
         #print "Generating flattened instance..."
@@ -128,37 +128,23 @@ def xls_to_dict(path_or_file):
             col_dict = {}
             col_name = sheet.cell_value(0, column)
             col_dict[constants.NAME] = col_name
-            col_dict["choice_labels"] = []
-            col_dict["prev_choice_labels"] = []
+            # (choice_label, prev_choice_label) pairs in order, without
+            # duplicates; the first column pairs labels with themselves
+            pairs = collections.OrderedDict()
             for row in range(1, sheet.nrows):
-
-                # pass 0: build col_dict for first time
                 key = sheet.cell_value(row, 0)
                 if key == "choice_label":
-                    col_dict["choice_labels"].append(
-                        xls_value_from_sheet(sheet, row, column))
+                    choice_label = xls_value_from_sheet(sheet, row, column)
                     if column > 1:
-                        col_dict["prev_choice_labels"].append(
-                            xls_value_from_sheet(sheet, row, column - 1))
+                        pairs[(choice_label, xls_value_from_sheet(
+                            sheet, row, column - 1))] = None
+                    else:
+                        pairs[(choice_label, choice_label)] = None
                 else:
                     col_dict[key] = xls_value_from_sheet(sheet, row, column)
-
-                # pass 1: make sure choice_labels are unique,
-                # while keeping the paired prev_choice_label consistent
-                def f(l, (x1, x2)):
-                    if (x1, x2) in l:
-                        return l
-                    else:
-                        return l + [(x1, x2)]
-                zipped = reduce(
-                    f,
-                    zip(col_dict["choice_labels"],
-                        col_dict["prev_choice_labels"]
-                        or col_dict["choice_labels"]), [])
-                col_dict["choice_labels"] = [a for a, b in zipped]
-                if column > 1:
-                    col_dict["prev_choice_labels"] = [b for a, b in zipped]
-                # end make things unique
+            col_dict["choice_labels"] = [a for a, b in pairs]
+            col_dict["prev_choice_labels"] = \
+                [b for a, b in pairs] if column > 1 else []
             result.append(col_dict)
 
         # pass 2: explode things according to prev_choices
@@ -179,7 +165,12 @@ def xls_to_dict(path_or_file):
                 }})
                 result2.append({"stopper": level[constants.NAME]})
                 continue
-            calc_formula_string = "'ERROR'"
+            choice_labels_by_prev = {}
+            for x, y in zip(level["choice_labels"],
+                            level["prev_choice_labels"]):
+                choice_labels_by_prev.setdefault(y, []).append(x)
+            # the calculate nests an if() for each prev choice
+            calc_formula_parts = []
             for prev_choice_label in set(level["prev_choice_labels"]):
                 prev_choice_name = slugify(prev_choice_label)
                 my_name = \
@@ -191,19 +182,17 @@ def xls_to_dict(path_or_file):
                     "label": level["label"],
                     "children": [
                         {constants.NAME: slugify(x), 'label': x}
-                        for (x, y) in zip(
-                            level["choice_labels"],
-                            level["prev_choice_labels"])
-                        if y == prev_choice_label],
+                        for x in choice_labels_by_prev[prev_choice_label]],
                     constants.BIND: {
                         u'relevant':
                         prev_choice_val + "='" + prev_choice_name + "'"},
                     "type": "select one"
                 }})
-                calc_formula_string = calc_formula_string.replace(
-                    "'ERROR'",
+                calc_formula_parts.append(
                     "if(" + prev_choice_val + "='" + prev_choice_name
-                    + "', ${" + my_name + "}, 'ERROR')")
+                    + "', ${" + my_name + "}, ")
+            calc_formula_string = "".join(calc_formula_parts) + "'ERROR'" + \
+                ")" * len(calc_formula_parts)
             result2.append({'lambda': {
                 constants.NAME: prefix + '_' + level[constants.NAME],
                 "type": "calculate",
@@ -212,7 +201,6 @@ def xls_to_dict(path_or_file):
         return result2
 
     def _xls_to_dict_cascade_sheet(sheet):
-        result = []
         rs_dict = {}  # tmp dict to hold entire structure
 
         def slugify(s):
@@ -223,7 +211,6 @@ def xls_to_dict(path_or_file):
             col_name = sheet.cell_value(0, column)
             rs_dict[col_name] = {
                 'pos': column,
-                'data': [],
                 'itemset': col_name,
                 'type': constants.SELECT_ONE,
                 constants.NAME:
@@ -245,28 +232,45 @@ def xls_to_dict(path_or_file):
                                      (prev_col_name, prefix, prev_col_name)
             rs_dict[col_name]['choice_filter'] = choice_filter
         # get data, use new cascade dict structure, data starts on 3 row
+        # the choices of every column, without duplicates, by their
+        # (list name, name, label, names of the previous columns' choices)
+        choices = collections.OrderedDict()
+        # the names of the choices of each column seen so far
+        seen = dict((col_name, set()) for col_name in rs_dict)
+        col_names = [sheet.cell_value(0, column)
+                     for column in range(sheet.ncols)]
         for row in range(2, sheet.nrows):
+            # each cell's data and name, and the names of the columns before
+            # each column, grown by one column at a time
+            cells = [None]
+            names = [None]
+            prev_names_by_column = [None, ()]
+            for column in range(1, sheet.ncols):
+                cells.append(xls_value_from_sheet(sheet, row, column))
+                names.append(slugify(cells[column]))
+                prev_names_by_column.append(
+                    prev_names_by_column[column] + (names[column],))
             # go through each header aka column
             for col_name in rs_dict:
                 column = rs_dict[col_name]['pos']
-                cell_data = xls_value_from_sheet(sheet, row, column)
-                try:
-                    rs_dict[col_name]['data'].index(slugify(cell_data))
-                except ValueError:
-                    rs_dict[col_name]['data'].append(slugify(cell_data))
+                cell_data = cells[column]
+                name = names[column]
+                if name not in seen[col_name]:
+                    seen[col_name].add(name)
                     if 'choices' in rs_dict[col_name]:
-                        l = {constants.NAME: slugify(cell_data), 'label': cell_data}
+                        l = {constants.NAME: name, 'label': cell_data}
                         rs_dict[col_name]['choices'].append(l)
+                prev_names = prev_names_by_column[column]
+                key = (col_name, name, cell_data.strip(), prev_names)
+                if key in choices:
+                    continue
                 data = {
-                    constants.NAME: slugify(cell_data),
+                    constants.NAME: name,
                     'label': cell_data.strip(),
                     constants.LIST_NAME: col_name
                 }
-                for prev_column in range(1, column):
-                    prev_col_name = sheet.cell_value(0, prev_column)
-                    data[prev_col_name] = slugify(xls_value_from_sheet(
-                        sheet, row, prev_column))
-                result.append(data)
+                data.update(zip(col_names[1:column], prev_names))
+                choices[key] = data
         # order
         kl = []
         for column in range(1, sheet.ncols):
@@ -275,25 +279,8 @@ def xls_to_dict(path_or_file):
                 rs_dict[col_name].pop('parent')
             if 'pos' in rs_dict[col_name]:
                 rs_dict[col_name].pop('pos')
-            if 'data' in rs_dict[col_name]:
-                rs_dict[col_name].pop('data')
             kl.append(rs_dict[col_name])
-
-    # create list with no duplicates
-        choices = []
-        for rec in result:
-            c = 0
-            for check in result:
-                if rec == check:
-                    c += 1
-            if c == 1:
-                choices.append(rec)
-            else:
-                try:
-                    choices.index(rec)
-                except ValueError:
-                    choices.append(rec)
-        return [{'choices': choices, 'questions': kl}]
+        return [{'choices': choices.values(), 'questions': kl}]
 
     result = {}
     for sheet in workbook.sheets():
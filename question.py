@@ -1,3 +1,5 @@
+import copy
+
 from utils import node
 from survey_element import SurveyElement
 from question_type_dictionary import QUESTION_TYPE_DICT
@@ -100,8 +102,37 @@ class UploadQuestion(Question):
                 )
 
 
+def _frozen(value):
+    if isinstance(value, dict):
+        return tuple(sorted([(k, _frozen(v)) for k, v in value.items()]))
+    if isinstance(value, list):
+        return tuple([_frozen(v) for v in value])
+    return value
+
+
 class Option(SurveyElement):
 
+    @classmethod
+    def interned(cls, interned_options, **kwargs):
+        """
+        Return an option with the given fields, copied from the equal option
+        in interned_options, a dict of options by content that is added to,
+        so each distinct option is only constructed once. Each question
+        still gets its own Option, as an option's parent gives its itext id,
+        and its own copies of the mutable label, media etc. dicts.
+        """
+        key = _frozen(kwargs)
+        prototype = interned_options.get(key)
+        if prototype is None:
+            prototype = interned_options[key] = cls(**kwargs)
+        option = cls.__new__(cls)
+        for k, v in prototype.items():
+            if isinstance(v, (dict, list)):
+                v = copy.deepcopy(v)
+            dict.__setitem__(option, k, v)
+        option[constants.CHILDREN] = []
+        return option
+
     def xml_value(self):
         return node(u"value", self.name)
 
@@ -146,9 +177,14 @@ class MultipleChoiceQuestion(Question):
         #Aliases in the json format will make it more difficult to use going forward.
         choices = kwargs_copy.pop(u"choices", []) + \
             kwargs_copy.pop(u"children", [])
+        # Options of other questions to share fields with, see Option.interned.
+        interned_options = kwargs_copy.pop(u"interned_options", None)
         Question.__init__(self, *args, **kwargs_copy)
         for choice in choices:
-            self.add_choice(**choice)
+            if interned_options is None:
+                self.add_choice(**choice)
+            else:
+                self.add_child(Option.interned(interned_options, **choice))
 
     def add_choice(self, **kwargs):
         option = Option(**kwargs)
@@ -203,6 +239,20 @@ class MultipleChoiceQuestion(Question):
         return bool((not self.get(constants.CHILDREN)) and self.get(constants.ITEMSET_XFORM))
 
 
+    def uses_shared_choice_list(self):
+        '''
+        Determine whether this question's choices come from a choice list that
+        is shared with other questions and emitted once as a secondary instance.
+        
+        :rtype: bool
+        '''
+        
+        itemset = self.get(constants.ITEMSET_XFORM)
+        shared_choices = self.get_root().get(constants.CHOICES) or {}
+        return bool(self.is_cascading_select() and (not self.get(u"choice_filter")) and \
+          isinstance(itemset, basestring) and (itemset in shared_choices))
+
+
 class SelectOneQuestion(MultipleChoiceQuestion):
     def __init__(self, *args, **kwargs):
         super(SelectOneQuestion, self).__init__(*args, **kwargs)
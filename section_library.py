@@ -0,0 +1,119 @@
+"""
+A library of prebuilt sections for include types.
+@see builder.SurveyElementBuilder
+"""
+import cPickle
+import hashlib
+import json
+import os
+import tempfile
+
+from file_utils import _included_section_names
+from pyxform import __version__
+
+
+class SectionLibrary(object):
+    """
+    Builds and validates each section included through include types once
+    and keeps it pickled. Including a section then unpickles a copy of its
+    prebuilt elements instead of building them from the section's dict
+    again. Sections are keyed by the sha1 of the json of the section, of the
+    sections it includes, directly or not, and of the builder's options, so
+    changing any of them builds the section again. The digest of each of
+    the builder's sections is only worked out once per builder.
+    With a directory, the built sections are also stored there as
+    <key>.json, so the library persists across processes. Those are only
+    json, so a shared directory can't run code, but it also means they are
+    not prebuilt: a section read from it is built again, only without being
+    validated, the first time each process includes it.
+    Pass the library to SurveyElementBuilder (or create_survey and friends)
+    as library.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._pickles = {}
+
+    @staticmethod
+    def _section_digest(name, builder):
+        digests = builder._section_digests
+        if name not in digests:
+            # Guards against sections that include themselves.
+            digests[name] = None
+            section = builder._sections.get(name)
+            if section is not None:
+                digests[name] = SectionLibrary._digest(section, builder)
+        return digests[name]
+
+    @staticmethod
+    def _digest(section_dict, builder):
+        included = sorted(
+            [(name, SectionLibrary._section_digest(name, builder))
+             for name in _included_section_names(section_dict)])
+        content = json.dumps([section_dict, included], sort_keys=True)
+        return hashlib.sha1(content).hexdigest()
+
+    @staticmethod
+    def section_key(section_dict, builder):
+        """
+        Return the key of the section dict, included with the builder, in
+        the library.
+        """
+        name = section_dict.get(u"name")
+        if builder._sections.get(name) is section_dict:
+            digest = SectionLibrary._section_digest(name, builder)
+        else:
+            digest = SectionLibrary._digest(section_dict, builder)
+        content = json.dumps([digest, builder._add_none_option])
+        return hashlib.sha1(__version__ + "\n" + content).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _pickle(self, key, builder):
+        if key not in self._pickles and self.directory is not None and \
+           os.path.exists(self._path(key)):
+            with open(self._path(key), "rb") as f:
+                section = builder.create_survey_element_from_dict(
+                    json.load(f))
+            self._pickles[key] = cPickle.dumps(
+                section, cPickle.HIGHEST_PROTOCOL)
+        return self._pickles.get(key)
+
+    def _store(self, key, section):
+        self._pickles[key] = cPickle.dumps(section, cPickle.HIGHEST_PROTOCOL)
+        if self.directory is None:
+            return
+        fd, path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            json.dump(section.to_json_dict(), f)
+        os.rename(path, self._path(key))
+
+    def add(self, section_dict, builder):
+        """
+        Build and validate the section dict with the builder if it is not in
+        the library yet and return its key.
+        """
+        key = self.section_key(section_dict, builder)
+        if self._pickle(key, builder) is None:
+            section = builder.create_survey_element_from_dict(section_dict)
+            section.validate()
+            self._store(key, section)
+        return key
+
+    def contains(self, section_dict, builder):
+        """
+        Return whether the section dict, included with the builder, is in
+        the library.
+        """
+        key = self.section_key(section_dict, builder)
+        return key in self._pickles or (
+            self.directory is not None and os.path.exists(self._path(key)))
+
+    def children(self, section_dict, builder):
+        """
+        Return a copy of the elements of the section dict, built by the
+        builder the first time.
+        """
+        key = self.add(section_dict, builder)
+        return cPickle.loads(self._pickles[key]).children
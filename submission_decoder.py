@@ -0,0 +1,159 @@
+"""
+Decode submissions of a survey into typed records.
+@see survey.Survey.submission_decoder
+"""
+from cStringIO import StringIO
+from datetime import date
+
+from lxml import etree
+
+from question import Question
+from section import Section, RepeatingSection
+from errors import PyXFormError
+
+
+def _decode_date(value):
+    year, month, day = value.split(u"-")
+    return date(int(year), int(month), int(day))
+
+
+def _decode_geopoint(value):
+    return tuple([float(coordinate) for coordinate in value.split()])
+
+
+def _decode_select_multiple(value):
+    return unicode(value).split()
+
+
+# Decoders of the values of each bind type, anything else stays a string.
+DECODERS = {
+    u"int": int,
+    u"decimal": float,
+    u"date": _decode_date,
+    u"geopoint": _decode_geopoint,
+    u"select": _decode_select_multiple,
+}
+
+
+class _Field(object):
+    """
+    An element of the instance: the column of a question or repeat, or a
+    group, which only has children. Repeats have the decoder of their
+    records.
+    """
+    __slots__ = ["xpath", "index", "decode", "decoder", "children"]
+
+    def __init__(self, xpath=None, index=None, decode=None, decoder=None):
+        self.xpath = xpath
+        self.index = index
+        self.decode = decode
+        self.decoder = decoder
+        self.children = {} if decoder is None else decoder._fields
+
+
+class SubmissionDecoder(object):
+    """
+    Decodes the submissions of a section (a survey or repeat) into records.
+    A record is a list with one value per column, in the order of columns:
+    the abbreviated xpaths of the questions and repeats in the section,
+    excluding those inside its repeats. types has the bind type of each
+    column, None for repeats.
+    Values are decoded according to their bind type (see DECODERS) and
+    empty values are None. The value of a repeat is a list of records of
+    its decoder in repeats.
+    The instance structure is compiled once from the survey, so decoding is
+    a single iterparse pass that looks each element up by name in its
+    parent. Elements that are not in the survey are skipped.
+    """
+
+    def __init__(self, section):
+        self.name = section.name
+        self.columns = []
+        self.types = []
+        self.repeats = {}
+        self._fields = {}
+        self._compile(section, self._fields)
+        self._repeat_indices = [self.columns.index(xpath)
+                                for xpath in self.repeats]
+
+    def _compile(self, section, fields):
+        for element in section.children:
+            if isinstance(element, RepeatingSection):
+                decoder = SubmissionDecoder(element)
+                xpath = element.get_abbreviated_xpath()
+                self.repeats[xpath] = decoder
+                fields[element.name] = _Field(
+                    xpath, len(self.columns), decoder=decoder)
+                self.columns.append(xpath)
+                self.types.append(None)
+            elif isinstance(element, Section):
+                if element.get(u"flat"):
+                    self._compile(element, fields)
+                else:
+                    field = fields[element.name] = _Field()
+                    self._compile(element, field.children)
+            elif isinstance(element, Question):
+                xpath = element.get_abbreviated_xpath()
+                bind_type = element.bind.get(u"type")
+                fields[element.name] = _Field(
+                    xpath, len(self.columns), DECODERS.get(bind_type))
+                self.columns.append(xpath)
+                self.types.append(bind_type)
+
+    def _new_record(self):
+        record = [None] * len(self.columns)
+        for index in self._repeat_indices:
+            record[index] = []
+        return record
+
+    def decode(self, xml_str):
+        """
+        Decode a submission, given as a string or a file-like object, into a
+        record.
+        """
+        if isinstance(xml_str, basestring):
+            if isinstance(xml_str, unicode):
+                xml_str = xml_str.encode("utf-8")
+            xml_str = StringIO(xml_str.strip())
+        record = self._new_record()
+        # (fields of the element's children, record, field) of each open
+        # element; fields is None below elements that are not in the survey.
+        stack = []
+        for event, element in etree.iterparse(xml_str, events=("start", "end")):
+            if event == "start":
+                if not stack:
+                    stack.append((self._fields, record, None))
+                    continue
+                fields, parent_record, field = stack[-1]
+                tag = element.tag
+                if tag[0] == "{":
+                    tag = tag[tag.index("}") + 1:]
+                field = None if fields is None else fields.get(tag)
+                if field is None:
+                    stack.append((None, parent_record, None))
+                elif field.decoder is not None:
+                    repeat_record = field.decoder._new_record()
+                    parent_record[field.index].append(repeat_record)
+                    stack.append((field.children, repeat_record, None))
+                else:
+                    stack.append((field.children, parent_record, field))
+            else:
+                fields, parent_record, field = stack.pop()
+                if field is not None and field.index is not None:
+                    value = element.text
+                    if value is None or not value.strip():
+                        value = None
+                    elif field.decode is None:
+                        value = unicode(value)
+                    else:
+                        try:
+                            value = field.decode(value)
+                        except ValueError:
+                            raise PyXFormError(
+                                "Invalid value %r for %s." % (
+                                    value, field.xpath))
+                    parent_record[field.index] = value
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+        return record
@@ -0,0 +1,162 @@
+"""
+Export the submissions of a survey as tables of columns.
+@see survey.Survey.submission_export
+"""
+import csv
+import os
+from datetime import date
+
+from submission_decoder import SubmissionDecoder
+from errors import PyXFormError
+
+INDEX = u"_index"
+PARENT_INDEX = u"_parent_index"
+
+# Bind types exported as numeric arrays, empty values become NaN.
+NUMERIC_TYPES = [u"int", u"decimal"]
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        value = u" ".join([unicode(item) for item in value])
+    elif isinstance(value, date):
+        value = value.isoformat()
+    elif isinstance(value, float):
+        value = repr(value)
+    return unicode(value).encode("utf-8")
+
+
+class _Table(object):
+    """
+    The table of a section: its record columns excluding repeats, which have
+    tables of their own. Repeat tables are named after their xpath.
+    """
+
+    def __init__(self, decoder, xpath=None):
+        self.name = decoder.name if xpath is None else xpath
+        self.indices = []
+        self.children = []
+        for index, column in enumerate(decoder.columns):
+            if column in decoder.repeats:
+                self.children.append(
+                    (index, _Table(decoder.repeats[column], column)))
+            else:
+                self.indices.append(index)
+        self.columns = [INDEX] + ([] if xpath is None else [PARENT_INDEX]) + \
+            [decoder.columns[index] for index in self.indices]
+        self.types = [u"int"] * (len(self.columns) - len(self.indices)) + \
+            [decoder.types[index] for index in self.indices]
+
+
+class SubmissionExport(object):
+    """
+    Exports the submissions of a survey as one table for the survey and one
+    for each repeat, named after the survey and the repeat's abbreviated
+    xpath. Each table has an INDEX column, numbering its rows from 1, then
+    the columns of its SubmissionDecoder; repeat tables also have a
+    PARENT_INDEX column with the INDEX of the row they belong to.
+    Submissions are decoded one at a time, so write_csv only holds one
+    submission in memory.
+    """
+
+    def __init__(self, survey):
+        self.decoder = SubmissionDecoder(survey)
+        self.table = _Table(self.decoder)
+        self.tables = []
+        self._add_tables(self.table)
+
+    def _add_tables(self, table):
+        self.tables.append(table)
+        for index, child in table.children:
+            self._add_tables(child)
+
+    def columns(self):
+        """
+        Return {table name: [column, ...]}.
+        """
+        return dict((table.name, table.columns) for table in self.tables)
+
+    def iter_rows(self, submissions):
+        """
+        Decode the submissions, given as strings or file-like objects, and
+        yield (table name, row) for the rows of every table, each submission's
+        repeat rows after its survey row.
+        """
+        counts = dict((table.name, 0) for table in self.tables)
+        for submission in submissions:
+            record = self.decoder.decode(submission)
+            # (table, record, parent row index) still to be yielded.
+            pending = [(self.table, record, None)]
+            while pending:
+                table, record, parent_index = pending.pop()
+                counts[table.name] += 1
+                index = counts[table.name]
+                row = [index] if parent_index is None else \
+                    [index, parent_index]
+                row.extend([record[i] for i in table.indices])
+                yield table.name, row
+                for column_index, child in reversed(table.children):
+                    pending.extend([
+                        (child, child_record, index)
+                        for child_record in reversed(record[column_index])])
+
+    def write_csv(self, submissions, files):
+        """
+        Write every table as CSV to files, a directory, where each table is
+        written to <table name>.csv with slashes replaced by dots, or a dict
+        of file-like objects by table name.
+        """
+        opened = []
+        if isinstance(files, basestring):
+            directory, files = files, {}
+            for table in self.tables:
+                path = os.path.join(
+                    directory, table.name.replace(u"/", u".") + u".csv")
+                files[table.name] = open(path, "wb")
+                opened.append(files[table.name])
+        try:
+            writers = {}
+            for table in self.tables:
+                writers[table.name] = csv.writer(
+                    files[table.name], quoting=csv.QUOTE_ALL)
+                writers[table.name].writerow(
+                    [column.encode("utf-8") for column in table.columns])
+            for name, row in self.iter_rows(submissions):
+                writers[name].writerow([_csv_cell(value) for value in row])
+        finally:
+            for f in opened:
+                f.close()
+
+    def to_arrays(self, submissions, numpy=False):
+        """
+        Return {table name: {column: values}} with a list of values for each
+        column of every table. With numpy, numeric columns are float64 arrays
+        with NaN for empty values and the others are object arrays.
+        """
+        arrays = dict((table.name, [[] for column in table.columns])
+                      for table in self.tables)
+        for name, row in self.iter_rows(submissions):
+            for values, value in zip(arrays[name], row):
+                values.append(value)
+        if numpy:
+            try:
+                import numpy as np
+            except ImportError:
+                raise PyXFormError("numpy is required for numpy arrays.")
+        result = {}
+        for table in self.tables:
+            columns = result[table.name] = {}
+            for column, column_type, values in zip(
+                    table.columns, table.types, arrays[table.name]):
+                if not numpy:
+                    columns[column] = values
+                elif column_type in NUMERIC_TYPES:
+                    columns[column] = np.array(
+                        [np.nan if value is None else value
+                         for value in values], dtype=np.float64)
+                else:
+                    columns[column] = np.empty(len(values), dtype=object)
+                    columns[column][:] = values
+        return result
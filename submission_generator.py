@@ -0,0 +1,295 @@
+"""
+Generate random submissions of a survey for load testing.
+@see survey.Survey.submission_generator
+"""
+import hashlib
+import multiprocessing
+import os
+import random
+import re
+import string
+import uuid
+from cStringIO import StringIO
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+from itertools import islice
+
+from question import Question, MultipleChoiceQuestion
+from section import Section, RepeatingSection
+from pyxform import constants
+
+# A constraint comparing the value to a number, e.g. ". >= 18".
+_BOUND = re.compile(r"^\s*\.\s*(<=|>=|<|>)\s*(-?\d+(?:\.\d+)?)\s*$")
+_AND = re.compile(r"\s+and\s+")
+
+_FIRST_DAY = date(2000, 1, 1)
+
+
+def _numeric_bounds(constraint, scale):
+    """
+    Return the smallest and largest numbers of 1/scale allowed by a
+    constraint made of comparisons of the value to numbers joined with
+    "and", None for a side the constraint doesn't bound. Other constraints
+    bound nothing.
+    """
+    low = high = None
+    for comparison in _AND.split(constraint):
+        match = _BOUND.match(comparison)
+        if match is None:
+            return None, None
+        operator, number = match.group(1), Decimal(match.group(2)) * scale
+        if operator[0] == ">":
+            bound = int(number.to_integral_value(rounding=ROUND_CEILING))
+            if operator == ">" and bound == number:
+                bound += 1
+            low = bound if low is None else max(low, bound)
+        else:
+            bound = int(number.to_integral_value(rounding=ROUND_FLOOR))
+            if operator == "<" and bound == number:
+                bound -= 1
+            high = bound if high is None else min(high, bound)
+    return low, high
+
+
+def _numeric_range(constraint, scale):
+    """
+    Return the range of numbers of 1/scale to pick values from: 0 to 100
+    when the constraint doesn't bound the value, or a range of 100 from the
+    bound it has when it only has one.
+    """
+    low, high = _numeric_bounds(constraint, scale)
+    if low is None and high is None:
+        return 0, 100 * scale
+    if high is None:
+        return low, low + 100 * scale
+    if low is None:
+        return high - 100 * scale, high
+    return low, high
+
+
+def _random_date(rng):
+    return _FIRST_DAY + timedelta(days=rng.randint(0, 9000))
+
+
+def _random_time(rng):
+    return u"%02d:%02d:%02d.000" % (
+        rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59))
+
+
+def _random_point(rng):
+    return u"%.6f %.6f %.1f %.1f" % (
+        rng.uniform(-90, 90), rng.uniform(-180, 180),
+        rng.uniform(0, 1000), rng.uniform(1, 50))
+
+
+def _random_points(rng):
+    return u";".join([_random_point(rng) for i in range(rng.randint(2, 5))])
+
+
+def _random_string(rng):
+    return u"".join([rng.choice(string.ascii_lowercase)
+                     for i in range(rng.randint(1, 12))])
+
+
+# Generators of random values for each bind type, taking the RNG.
+GENERATORS = {
+    constants.STRING_XFORM: _random_string,
+    constants.BOOLEAN_XFORM: lambda rng: rng.choice([u"true", u"false"]),
+    constants.DATE_XFORM: lambda rng: _random_date(rng).isoformat(),
+    constants.TIME_XFORM: _random_time,
+    constants.DATETIME_XFORM: lambda rng: u"%sT%s" % (
+        _random_date(rng).isoformat(), _random_time(rng)),
+    constants.GEOPOINT_XFORM: _random_point,
+    constants.GEOTRACE_XFORM: _random_points,
+    constants.GEOSHAPE_XFORM: _random_points,
+    constants.BINARY_XFORM: lambda rng: u"%d.jpg" % rng.randint(0, 10 ** 9),
+    constants.BARCODE_XFORM: lambda rng: u"%012d" % rng.randint(0, 10 ** 12),
+}
+
+
+def _int_generator(constraint):
+    low, high = _numeric_range(constraint, 1)
+    if low > high:
+        return lambda rng: None
+    return lambda rng: rng.randint(low, high)
+
+
+def _decimal_generator(constraint):
+    # Decimals have two decimal places, so they are picked in hundredths.
+    low, high = _numeric_range(constraint, 100)
+    if low > high:
+        return lambda rng: None
+    return lambda rng: rng.randint(low, high) / 100.0
+
+
+def _select_generator(names, multiple):
+    if not names:
+        return lambda rng: None
+    if multiple:
+        return lambda rng: rng.sample(names, rng.randint(1, len(names)))
+    return lambda rng: rng.choice(names)
+
+
+def _submission_seed(seed, number):
+    """
+    Return the integer seed of submission number. Seeding with a tuple
+    would use hash(), which differs between interpreters.
+    """
+    return int(hashlib.sha1(repr((seed, number))).hexdigest(), 16)
+
+
+def _instance_id(rng):
+    return u"uuid:%s" % uuid.UUID(int=rng.getrandbits(128))
+
+
+class SubmissionGenerator(object):
+    """
+    Generates random submissions of a survey. Values are valid for their bind
+    type: numbers respect simple constraints like ". > 0 and . <= 120"
+    (questions whose constraint no number meets are left empty),
+    selects pick from their choices and repeats get from 0 to max_repeats
+    records. Calculated and read-only questions are left empty, except the
+    instanceID, which gets a random uuid.
+    Submission number n is generated from an RNG seeded with an integer
+    derived from (seed, n), so the same seed gives the same submissions
+    however they are split across processes, and on any interpreter.
+    """
+
+    def __init__(self, survey, seed=None, max_repeats=3):
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.max_repeats = max_repeats
+        self._survey = survey
+        self._choices = survey.get(constants.CHOICES) or {}
+        self._plan = self._compile(survey)
+        self._writer = survey.instance_writer()
+
+    def _compile(self, section):
+        """
+        Return the (name, generator, repeat plan) of each question and repeat
+        of the section, including those in its groups.
+        """
+        plan = []
+        for element in section.children:
+            if isinstance(element, RepeatingSection):
+                plan.append((element.name, None, self._compile(element)))
+            elif isinstance(element, Section):
+                plan.extend(self._compile(element))
+            elif isinstance(element, Question):
+                generator = self._question_generator(element)
+                if generator is not None:
+                    plan.append((element.name, generator, None))
+        return plan
+
+    def _question_generator(self, question):
+        bind = question.bind
+        bind_type = bind.get(constants.TYPE)
+        if question.name == u"instanceID":
+            return _instance_id
+        if bind.get(constants.CALCULATE_XFORM) or \
+           bind.get(constants.READONLY_XFORM):
+            return None
+        constraint = bind.get(constants.CONSTRAINT_XFORM, u"")
+        if bind_type == constants.INT_XFORM:
+            return _int_generator(constraint)
+        if bind_type == constants.DECIMAL_XFORM:
+            return _decimal_generator(constraint)
+        if isinstance(question, MultipleChoiceQuestion):
+            names = [option.name for option in question.children]
+            itemset = question.get(constants.ITEMSET_XFORM)
+            if not names and isinstance(itemset, basestring):
+                names = [choice[constants.NAME]
+                         for choice in self._choices.get(itemset, [])]
+            return _select_generator(
+                names, bind_type == constants.SELECT_ALL_THAT_APPLY_XFORM)
+        return GENERATORS.get(bind_type)
+
+    def _answers(self, plan, rng):
+        answers = {}
+        for name, generator, repeat_plan in plan:
+            if repeat_plan is None:
+                answers[name] = generator(rng)
+            else:
+                answers[name] = [
+                    self._answers(repeat_plan, rng)
+                    for i in range(rng.randint(0, self.max_repeats))]
+        return answers
+
+    def answers(self, number):
+        """
+        Return the dict of answers of submission number.
+        """
+        return self._answers(
+            self._plan, random.Random(_submission_seed(self.seed, number)))
+
+    def submission(self, number):
+        """
+        Return the XML of submission number.
+        """
+        f = StringIO()
+        self._writer.write(self.answers(number), f)
+        return f.getvalue()
+
+    def generate(self, count, processes=1, chunksize=64):
+        """
+        Yield the XML of submissions 0 to count - 1 in order, generating them
+        across a pool of processes (cpu count if None) in chunks of
+        chunksize.
+        """
+        if processes == 1:
+            for number in xrange(count):
+                yield self.submission(number)
+            return
+        processes = processes or multiprocessing.cpu_count()
+        # The plan holds closures, so workers compile their own generator.
+        pool = multiprocessing.Pool(
+            processes, initializer=_init_worker,
+            initargs=(self._survey, self.seed, self.max_repeats))
+        chunks = iter((start, min(start + chunksize, count))
+                      for start in xrange(0, count, chunksize))
+        try:
+            while True:
+                batch = list(islice(chunks, processes * 4))
+                if not batch:
+                    break
+                for submissions in pool.imap(_generate_chunk, batch):
+                    for submission in submissions:
+                        yield submission
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def write_directory(self, count, directory, **kwargs):
+        """
+        Write count submissions to <number>.xml files in directory and return
+        their paths. Keyword arguments are passed to generate.
+        """
+        paths = []
+        for number, submission in enumerate(self.generate(count, **kwargs)):
+            paths.append(os.path.join(directory, "%d.xml" % number))
+            with open(paths[-1], "wb") as f:
+                f.write(submission)
+        return paths
+
+    def write_stream(self, count, f, **kwargs):
+        """
+        Write count submissions to the file-like object f, one per line.
+        Keyword arguments are passed to generate.
+        """
+        for submission in self.generate(count, **kwargs):
+            f.write(submission)
+            f.write("\n")
+
+
+# The generator of a pool worker, set when the worker starts.
+_worker_generator = None
+
+
+def _init_worker(survey, seed, max_repeats):
+    global _worker_generator
+    _worker_generator = SubmissionGenerator(survey, seed, max_repeats)
+
+
+def _generate_chunk(chunk):
+    start, stop = chunk
+    return [_worker_generator.submission(number)
+            for number in xrange(start, stop)]
@@ -173,7 +173,9 @@ class SurveyElement(dict):
         """
         self.validate()
         result = self.copy()
-        to_delete = [u"parent", u"question_type_dictionary", u"_created"]
+        to_delete = [u"parent", u"question_type_dictionary", u"_created",
+                     u"_translations", u"_choice_lists", u"_xpath",
+                     u"_instance_writer"]
         for key in to_delete:
             if key in result:
                 del result[key]
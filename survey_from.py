@@ -29,6 +29,21 @@ def xform(path=None, filelike_obj=None, warnings=None):
     return survey
 
 
+def xforms(filelike_objs, warnings=None):
+    '''
+    Construct a 'Survey' object from each XML XForm in a stream of file-like
+    objects. Forms are imported one at a time as the stream is consumed, so
+    only the current form is held in memory.
+
+    :param filelike_objs: Iterable of file-like objects, e.g. a generator opening each file in turn.
+    :param list warnings: Optional list into which any warnings generated during import will be appended.
+    :rtype: generator of pyxform.survey.Survey
+    '''
+
+    for filelike_obj in filelike_objs:
+        yield xform(filelike_obj=filelike_obj, warnings=warnings)
+
+
 def xls(path=None, filelike_obj=None, warnings=None):
     '''
     Construct a 'Survey' object from an XLS-formatted XLSForm.
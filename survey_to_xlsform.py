@@ -11,11 +11,12 @@ as methods on 'Survey' objects.
 
 from __future__ import absolute_import
 
-import base64
 import re
-import os
 import cStringIO
 import csv
+import marshal
+import tempfile
+from itertools import chain
 #import json    # Used by 'to_ssjson()'
 
 import xlwt
@@ -30,6 +31,103 @@ GROUP_EXPORT_WARNING= 'Exporting groups to XLSForms is currently an experimental
 SKIP_LOGIC_EXPORT_WARNING= 'Exporting skip logic in XLSForms is not currently supported.'
 CALCULATION_EXPORT_WARNING= 'Exporting calculations to XLSForms is currently an experimental feature.'
 
+# The most rows a '.xls' sheet can hold; use 'to_xlsx()' for larger sheets.
+XLS_MAX_ROWS= 65536
+# Created once and shared by every header cell.
+XLS_HEADER_STYLE= xlwt.easyxf('font: bold on')
+# The most 'choices' sheet rows held in memory before spilling to a temporary file.
+CHOICES_SPILL_THRESHOLD= 10000
+
+
+class ColumnRegistry(list):
+    '''
+    The ordered column names of a sheet. Being a list, it doubles as the 
+    sheet's header row, while a dictionary of column indices makes 'in' and 
+    'index()' O(1) lookups, so recording a cell doesn't scan every column.
+    '''
+
+    def __init__(self, columns=()):
+        list.__init__(self)
+        self.column_indices= dict()
+        self.extend(columns)
+
+    def __contains__(self, column_name):
+        return column_name in self.column_indices
+
+    def index(self, column_name):
+        try:
+            return self.column_indices[column_name]
+        except KeyError:
+            raise ValueError('"{}" is not a column.'.format(column_name))
+
+    def append(self, column_name):
+        if column_name in self.column_indices:
+            raise PyXFormError('Duplicate column "{}".'.format(column_name))
+        self.column_indices[column_name]= len(self)
+        list.append(self, column_name)
+
+    def extend(self, column_names):
+        for column_name in column_names:
+            self.append(column_name)
+
+    def __setitem__(self, i_column, column_name):
+        '''
+        Rename the column at the given index.
+        '''
+        del self.column_indices[self[i_column]]
+        self.column_indices[column_name]= i_column
+        list.__setitem__(self, i_column, column_name)
+
+    def new_row(self):
+        '''
+        Return a row with an initially empty entry for each column.
+        '''
+        return [''] * len(self)
+
+
+class RowBuffer(object):
+    '''
+    Rows kept in memory until there are more than 'threshold' of them, when 
+    they are spilled to a temporary file with 'marshal', so that buffering a 
+    sheet takes bounded memory. Iterating yields the rows in the order added.
+    '''
+
+    def __init__(self, threshold=CHOICES_SPILL_THRESHOLD):
+        self.threshold= threshold
+        self.rows= list()
+        self.spill_file= None
+        self.spilled_count= 0
+
+    def __len__(self):
+        return self.spilled_count + len(self.rows)
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) > self.threshold:
+            self.spill()
+
+    def spill(self):
+        if self.spill_file is None:
+            self.spill_file= tempfile.TemporaryFile()
+        self.spill_file.seek(0, 2)
+        for row in self.rows:
+            marshal.dump(row, self.spill_file)
+        self.spilled_count+= len(self.rows)
+        self.rows= list()
+
+    def __iter__(self):
+        if self.spill_file is not None:
+            self.spill_file.seek(0)
+            for _ in xrange(self.spilled_count):
+                yield marshal.load(self.spill_file)
+        for row in self.rows:
+            yield row
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file= None
+
 
 class XlsFormExporter():
     
@@ -37,26 +135,31 @@ class XlsFormExporter():
     CASCADING_SELECT_SAD_CHOICE_NAME= u'question_choices_not_imported'
     CASCADING_SELECT_SAD_CHOICE_LABEL= u'Apologies, your choices for this (cascading-select) question could not be automatically imported.'
     
-    def __init__(self, survey, warnings=None):
+    def __init__(self, survey, warnings=None, spill_threshold=CHOICES_SPILL_THRESHOLD):
         '''
         Prepare a representation of the survey ready to be easily exported as a 
-        XLS or CSV XLSForm.
+        XLS or CSV XLSForm. Rows are only generated as 'iter_sheets()' is 
+        consumed, in a single traversal of the survey that buffers the 'survey' 
+        and 'choices' sheets' rows, registering columns as rows first use them, 
+        so that each sheet's column names are complete before its first row.
 
         :param pyxform.survey.Survey survey: The survey to be exported.
         :param list warnings: Optional list into which any warnings generated during export will be appended.
+        :param int spill_threshold: The most 'choices' sheet rows held in memory before spilling to a temporary file.
         '''
         
         # TODO: Support repeats, 'or_other', hints, constraints, ...
         
-        # TODO: Ideally would want a data structure that preserves order while providing O(1) lookups. Ordered set? (http://stackoverflow.com/q/1653970)
         # Pre-populate with mandatory columns where possible (i.e. not label(s)).
-        self.survey_sheet_columns= [constants.NAME, constants.TYPE]
-        self.choices_sheet_columns= [constants.LIST_NAME, constants.NAME]
-        self.settings_sheet_columns= list()
+        self.survey_sheet_columns= ColumnRegistry([constants.NAME, constants.TYPE])
+        self.choices_sheet_columns= ColumnRegistry([constants.LIST_NAME, constants.NAME])
+        self.settings_sheet_columns= ColumnRegistry()
 
-        self.survey_sheet_rows= [self.survey_sheet_columns]
-        self.choices_sheet_rows= [self.choices_sheet_columns]
         self.settings_sheet_rows= [self.settings_sheet_columns]
+
+        self.survey= survey
+        self.spill_threshold= spill_threshold
+        self.survey_traversed= False
         
         # Keep track of any warnings generated.
         if warnings != None:    # Directly test for 'None' since empty iterables are also "falsy".
@@ -65,25 +168,106 @@ class XlsFormExporter():
             self.warnings= list()
         
         self.record_settings(survey)
-        
-        self.record_question_container(survey)
-        
-        # Store the non-empty sheets.
-        self.sheet_dict= dict()
-        if len(self.survey_sheet_rows) > 1:
-            self.sheet_dict[constants.SURVEY]= self.survey_sheet_rows
-        if len(self.choices_sheet_rows) > 1:
-            self.sheet_dict[constants.CHOICES]= self.choices_sheet_rows
-        if len(self.settings_sheet_rows) > 1:
-            self.sheet_dict[constants.SETTINGS]= self.settings_sheet_rows
+
+
+    @property
+    def sheet_dict(self):
+        '''
+        The rows of the non-empty sheets keyed by sheet name, the first row of 
+        each being its column names. Prefer 'iter_sheets()' to avoid holding 
+        every row in memory.
+
+        :rtype: {str: list}
+        '''
+
+        return dict((sheet_name, list(sheet_rows)) for sheet_name, sheet_rows in self.iter_sheets())
+
+
+    def iter_sheets(self):
+        '''
+        Yield the name and a row iterator for each non-empty sheet, the first row 
+        being the column names. The sheets are generated in order, so consume 
+        each sheet's rows before moving on to the next.
+
+        :rtype: generator of (str, iterator)
+        '''
+
+        for sheet_name, sheet_rows in [(constants.SETTINGS, iter(self.settings_sheet_rows)), \
+          (constants.SURVEY, self.iter_survey_rows()), (constants.CHOICES, self.iter_choices_rows())]:
+            header_row= next(sheet_rows)
+            # Check for a data row before committing to the sheet.
+            for first_row in sheet_rows:
+                yield sheet_name, chain([header_row, first_row], sheet_rows)
+                break
+
+
+    def traverse_survey(self):
+        '''
+        Traverse the survey, buffering the 'survey' and 'choices' sheets' rows 
+        and registering their columns.
+        '''
+
+        # The list name of each distinct set of choices, keyed by fingerprint.
+        self.choice_list_names= dict()
+        self.used_list_names= set()
+        self.survey_sheet_rows= RowBuffer(self.spill_threshold)
+        self.choices_sheet_rows= RowBuffer(self.spill_threshold)
+
+        for survey_row in self.record_question_container(self.survey):
+            self.survey_sheet_rows.append(survey_row)
+        self.survey_traversed= True
+
+
+    @staticmethod
+    def iter_buffered_rows(columns, sheet_rows):
+        '''
+        Yield the column names and then the buffered rows, padding rows recorded 
+        before later columns were registered.
+        '''
+
+        yield columns
+        n_columns= len(columns)
+        for row in sheet_rows:
+            if len(row) < n_columns:
+                row= row + [''] * (n_columns - len(row))
+            yield row
+        sheet_rows.close()
+
+
+    def iter_survey_rows(self):
+        '''
+        Yield the 'survey' sheet's column names and rows.
+        '''
+
+        self.traverse_survey()
+        for survey_row in self.iter_buffered_rows(self.survey_sheet_columns, self.survey_sheet_rows):
+            yield survey_row
+
+
+    def iter_choices_rows(self):
+        '''
+        Yield the 'choices' sheet's column names and rows, traversing the survey 
+        first if that hasn't already been done.
+        '''
+
+        if not self.survey_traversed:
+            self.traverse_survey()
+        for choices_row in self.iter_buffered_rows(self.choices_sheet_columns, self.choices_sheet_rows):
+            yield choices_row
+        self.survey_traversed= False
 
 
     def record_question_container(self, question_container):
+        '''
+        Yield the 'survey' sheet rows of the elements in the container.
+        '''
+
         for child_element in question_container['children']:
             if isinstance(child_element, pyxform.question.Question):
-                self.record_question_data(child_element)
+                yield self.record_question_data(child_element)
             elif isinstance(child_element, pyxform.section.GroupedSection):
-                self.record_grouped_section(child_element)
+                for survey_row in self.record_grouped_section(child_element):
+                    yield survey_row
             else:
                 raise PyXFormError('Unexpected survey child type "{}".'.format(type(child_element)))
 
@@ -94,10 +278,12 @@ class XlsFormExporter():
         for multiple-choice questions.
         
         :param pyxform.question.Question question:
+        :returns: The question's 'survey' sheet row.
+        :rtype: list
         '''
 
         # Create a list with an initially empty entry for each column in the sheet.
-        survey_row= [''] * len(self.survey_sheet_columns)
+        survey_row= self.survey_sheet_columns.new_row()
 
         # Record the entry for the mandatory 'name' column.
         question_name= question[constants.NAME]
@@ -115,23 +301,28 @@ class XlsFormExporter():
               [constants.SELECT_ONE_XLSFORM, constants.SELECT_ALL_THAT_APPLY_XLSFORM]:
                 raise PyXFormError('Unexpected multiple-choice question type "{}"'.format(question['type']))
 
-            # TODO: Would be nice to reuse the 'list name' when encountering reused sets of choices.
-            # Generate a 'list name' comprised of the question name followed by 8 random bytes cast to string.
-            list_name= question_name + '_' + base64.urlsafe_b64encode(os.urandom(8))
-
-            # Strip out any non-alphanumeric characters so KoBoForm can import. \
-            #   Decreasing the space of possible strings, while an egregious \
-            #   affront, should be safe.
-            list_name= re.compile('[\W_]+').sub('_', list_name)
+            if question.uses_shared_choice_list():
+                # The choices from the survey-level list the question shares.
+                question_choices= question.get_root()[constants.CHOICES][question[constants.ITEMSET_XFORM]]
+            elif question.is_cascading_select():
+                question_choices= None
+            else:
+                question_choices= question[constants.CHILDREN]
+            if question_choices is not None:
+                choice_labels= [self.get_survey_element_label(question_choice) for question_choice in question_choices]
+            else:
+                choice_labels= None
 
+            # Questions with identical choices share one list.
+            list_name, is_new_list= self.get_choice_list_name(question_name, question_choices, choice_labels)
             survey_row[self.survey_sheet_columns.index(constants.TYPE)]= xlsform_question_type + ' ' + list_name
 
             # TODO: Handle cascading-select questions (http://opendatakit.github.io/odk-xform-spec/#secondary-instances).
             # If the question appears to be a cascading-select, report in the
             #   output that the question choices could not be gathered.
-            if question.is_cascading_select():
+            if is_new_list and (question_choices is None):
                 # Deferring documentation to 'record_question_choice()'...
-                cascading_select_sad_choices_row= [''] * len(self.choices_sheet_columns)
+                cascading_select_sad_choices_row= self.choices_sheet_columns.new_row()
                 dict_to_insert= {constants.LIST_NAME: list_name, constants.NAME: self.CASCADING_SELECT_SAD_CHOICE_NAME}
                 self.insert_dict_into_row(dict_to_insert, cascading_select_sad_choices_row, self.choices_sheet_columns)
                 
@@ -146,10 +337,10 @@ class XlsFormExporter():
                 if self.CASCADING_SELECT_WARNING not in self.warnings:
                     self.warnings.append(self.CASCADING_SELECT_WARNING)
 
-            else:
+            elif is_new_list:
                 # Extract and record the choices.
-                for question_choice in question[constants.CHILDREN]:
-                    self.record_question_choice(question_choice, list_name)
+                for question_choice, choice_label_dict in zip(question_choices, choice_labels):
+                    self.record_question_choice(question_choice, list_name, choice_label_dict)
 
         # Record entries for the mandatory 'label' and/or 'label::X' columns.
         question_label_dict= self.get_survey_element_label(question)
@@ -172,32 +363,78 @@ class XlsFormExporter():
             dict_to_insert= {constants.REQUIRED_XFORM: question[constants.BIND][constants.REQUIRED_XFORM]}
             self.insert_dict_into_row(dict_to_insert, survey_row, self.survey_sheet_columns)
 
-        # Add the row into the 'survey' sheet.
-        self.survey_sheet_rows.append(survey_row)
+        return survey_row
+
+
+    def get_choice_list_name(self, question_name, question_choices, choice_labels):
+        '''
+        Return the 'list name' for a question's choices and whether the list is 
+        new. Lists are fingerprinted by their choices' names and labels, so 
+        identical lists share the name of the first question using them, which 
+        keeps repeated exports identical.
+
+        :param str question_name:
+        :param list question_choices: The question's choices, or 'None' for a cascading select.
+        :param list choice_labels: The label dictionary of each choice, or 'None' for a cascading select.
+        :rtype: (str, bool)
+        '''
+
+        if question_choices is None:
+            fingerprint= (self.CASCADING_SELECT_SAD_CHOICE_NAME,)
+        else:
+            # Order the labels by column once per list rather than sorting each choice's labels.
+            label_columns= tuple(sorted(set().union(*choice_labels)))
+            fingerprint= (label_columns,) + tuple( \
+              (question_choice[constants.NAME],) + tuple([choice_label_dict.get(c) for c in label_columns]) \
+              for question_choice, choice_label_dict in zip(question_choices, choice_labels))
+
+        list_name= self.choice_list_names.get(fingerprint)
+        if list_name is not None:
+            return list_name, False
+
+        # Strip out any non-alphanumeric characters so KoBoForm can import.
+        list_name= re.compile('[\W_]+').sub('_', question_name)
+        # Different questions' names may still clash once stripped.
+        unique_list_name= list_name
+        i_duplicate= 1
+        while unique_list_name in self.used_list_names:
+            i_duplicate+= 1
+            unique_list_name= list_name + '_' + str(i_duplicate)
+        self.used_list_names.add(unique_list_name)
+        self.choice_list_names[fingerprint]= unique_list_name
+        return unique_list_name, True
 
 
     @staticmethod
     def insert_dict_into_row(dict_to_insert, row, columns):
+        '''
+        :param dict dict_to_insert: Cell values keyed by column name.
+        :param list row: A row created with 'columns.new_row()'.
+        :param ColumnRegistry columns:
+        '''
 
+        column_indices= columns.column_indices
         for column_name, cell_value in dict_to_insert.iteritems():
-            if column_name in columns:
-                row[columns.index(column_name)]= cell_value
+            i_column= column_indices.get(column_name)
+            if i_column is not None:
+                row[i_column]= cell_value
             else:
                 # A previously unencountered column.
                 columns.append(column_name)
                 row.append(cell_value)
 
 
-    def record_question_choice(self, question_choice, list_name):
+    def record_question_choice(self, question_choice, list_name, choice_label_dict=None):
         '''
         Record the information for an individual choice from a multiple-choice question.
         
         :param pyxform.question.Option question_choice: The choice being imported.
         :param str list_name: A unique identifier for the set of choices this choice belongs to.
+        :param dict choice_label_dict: The choice's labels, if already gathered by 'get_survey_element_label()'.
         '''
         
         # Create a list with an initially empty entry for each column in the sheet.
-        choices_row= [''] * len(self.choices_sheet_columns)
+        choices_row= self.choices_sheet_columns.new_row()
         
         # Record the entry for the mandatory 'list name' column.
         choices_row[self.choices_sheet_columns.index(constants.LIST_NAME)]= list_name
@@ -205,7 +442,8 @@ class XlsFormExporter():
         choices_row[self.choices_sheet_columns.index(constants.NAME)]= question_choice[constants.NAME]
         
         # Record entries for the mandatory 'label' and/or 'label::X' columns.
-        choice_label_dict= self.get_survey_element_label(question_choice)
+        if choice_label_dict is None:
+            choice_label_dict= self.get_survey_element_label(question_choice)
         if not choice_label_dict:
             raise PyXFormError('Choices for multiple-choice questions must have at least one label.')
         self.insert_dict_into_row(choice_label_dict, choices_row, self.choices_sheet_columns)
@@ -216,7 +454,7 @@ class XlsFormExporter():
 
     def record_grouped_section(self, grouped_section):
         '''
-        Record the data associated with a group of questions.
+        Yield the 'survey' sheet rows of a group of questions.
         
         :param pyxform.section.GroupedSection grouped_section:
         '''
@@ -232,7 +470,7 @@ class XlsFormExporter():
             self.warnings.append(GROUP_EXPORT_WARNING)
 
         # Generate the group's header.
-        group_header= [''] * len(self.survey_sheet_columns)
+        group_header= self.survey_sheet_columns.new_row()
         # Record the entry for the mandatory 'name' column.
         group_name= grouped_section[constants.NAME]
         group_header[self.survey_sheet_columns.index(constants.NAME)]= group_name
@@ -245,18 +483,19 @@ class XlsFormExporter():
         self.insert_dict_into_row(group_label_dict, group_header, self.survey_sheet_columns)
 
         # Insert the group header into the "survey" sheet.
-        self.survey_sheet_rows.append(group_header)
+        yield group_header
         
         # Record the grouped questions and/or sub-groups.
-        self.record_question_container(grouped_section)
+        for survey_row in self.record_question_container(grouped_section):
+            yield survey_row
 
         # Generate and insert the group's footer.
-        group_footer= [''] * len(self.survey_sheet_columns)
+        group_footer= self.survey_sheet_columns.new_row()
         # Record the entry for the mandatory 'type' column.
         group_footer[self.survey_sheet_columns.index(constants.TYPE)]= u'end group'
         # Additionally record the group name, for clarity.
         group_footer[self.survey_sheet_columns.index(constants.NAME)]= group_name
-        self.survey_sheet_rows.append(group_footer)
+        yield group_footer
         
 
     def record_settings(self, survey):
@@ -319,16 +558,18 @@ def to_xls(survey, path=None, warnings=None):
     '''
     
     # Organize the data for spreadsheet output.
-    sheet_dict= XlsFormExporter(survey, warnings).sheet_dict
+    exporter= XlsFormExporter(survey, warnings)
     
     workbook= xlwt.Workbook(encoding='UTF-8')
     # Write out the data sheet-by-sheet.
-    for sheet_name, sheet_rows in sheet_dict.iteritems():
+    for sheet_name, sheet_rows in exporter.iter_sheets():
         worksheet= workbook.add_sheet(sheet_name)
         for i_row, r in enumerate(sheet_rows):
+            if i_row == XLS_MAX_ROWS:
+                raise PyXFormError('The "{}" sheet has more than {} rows, the XLS limit. Export to XLSX instead.'.format(sheet_name, XLS_MAX_ROWS))
             # Bold the top row.
             if i_row == 0:
-                style_kwarg= {'style': xlwt.easyxf('font: bold on')}
+                style_kwarg= {'style': XLS_HEADER_STYLE}
             elif style_kwarg:
                 style_kwarg= dict()
             # Enter the data.
@@ -345,24 +586,69 @@ def to_xls(survey, path=None, warnings=None):
         return filelike_obj
 
 
-def to_csv(survey, path=None, warnings=None, koboform=False):
+def to_xlsx(survey, path=None, warnings=None):
     '''
-    Convert the provided survey to a CSV-formatted XLSForm.
+    Convert the provided survey to a XLSX-encoded XLSForm. Rows are appended 
+    to a write-only workbook, which streams them to disk instead of keeping 
+    cell objects, so sheets may exceed the XLS row limit. Requires 'openpyxl'.
     
     :param pyxform.survey.Survey survey:
     :param str path: Optional filesystem path to the desired output file.
     :param list warnings: Optional list into which any warnings generated during export will be appended.
-    :param bool koboform: Optional flag to specially format the output for KoBoForm.
     :returns: If the 'path' parameter was omitted, nothing. Otherwise, a buffer containing the exported form.
     :rtype: NoneType or 'cStringIO.StringIO'
     '''
+
+    try:
+        import openpyxl
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+    except ImportError:
+        raise PyXFormError('Exporting to XLSX requires the "openpyxl" package.')
     
     # Organize the data for spreadsheet output.
-    sheet_dict= XlsFormExporter(survey, warnings).sheet_dict
+    exporter= XlsFormExporter(survey, warnings)
+
+    workbook= openpyxl.Workbook(write_only=True)
+    # One font for every header cell, so the workbook stores a single style.
+    header_font= Font(bold=True)
+    # Write out the data sheet-by-sheet, streaming rows from the exporter.
+    for sheet_name, sheet_rows in exporter.iter_sheets():
+        worksheet= workbook.create_sheet(sheet_name)
+        for i_row, r in enumerate(sheet_rows):
+            if i_row == 0:
+                # Bold the top row.
+                header_row= list()
+                for cell_data in r:
+                    header_cell= WriteOnlyCell(worksheet, cell_data)
+                    header_cell.font= header_font
+                    header_row.append(header_cell)
+                worksheet.append(header_row)
+            else:
+                # Leave empty cells out of the file altogether.
+                worksheet.append([cell_data if cell_data != '' else None for cell_data in r])
 
-    # If exporting for KoBoForm, ensure there is one "label" column.
-    survey_columns= sheet_dict[constants.SURVEY][0]
-    if koboform and ('label' not in survey_columns):
+    if path:
+        workbook.save(path)
+    else:
+        filelike_obj= cStringIO.StringIO()
+        workbook.save(filelike_obj)
+        filelike_obj.seek(0)    # As a courtesy.
+        return filelike_obj
+
+
+def get_koboform_header_renames(survey_columns, warnings=None):
+    '''
+    KoBoForm needs one "label" column, so choose a label column to rename to 
+    "label" in both the "survey" and "choices" sheets' headers.
+
+    :param list survey_columns: The 'survey' sheet's column names.
+    :param list warnings: Optional list into which any warnings generated during export will be appended.
+    :rtype: {str: str}
+    '''
+
+    header_renames= dict()
+    if 'label' not in survey_columns:
         label_columns= [c for c in survey_columns if constants.LABEL in c]
 
         # Since the KoBoForm UI is in English, try using that first. 
@@ -378,11 +664,25 @@ def to_csv(survey, path=None, warnings=None, koboform=False):
             language_default_warning= 'Multiple translations are not supported in KoBoForm. Defaulting to language "{}".'.format(chosen_language)
             warnings.append(language_default_warning)
 
-        # Rename the selected label column to "label" in both the "survey" and "choices" sheets.
-        survey_columns[survey_columns.index(chosen_label_column)]= constants.LABEL
-        if constants.CHOICES in sheet_dict:
-            choices_columns= sheet_dict[constants.CHOICES][0]
-            choices_columns[choices_columns.index(chosen_label_column)]= constants.LABEL
+        header_renames[chosen_label_column]= constants.LABEL
+
+    return header_renames
+
+
+def to_csv(survey, path=None, warnings=None, koboform=False):
+    '''
+    Convert the provided survey to a CSV-formatted XLSForm.
+    
+    :param pyxform.survey.Survey survey:
+    :param str path: Optional filesystem path to the desired output file.
+    :param list warnings: Optional list into which any warnings generated during export will be appended.
+    :param bool koboform: Optional flag to specially format the output for KoBoForm.
+    :returns: If the 'path' parameter was omitted, nothing. Otherwise, a buffer containing the exported form.
+    :rtype: NoneType or 'cStringIO.StringIO'
+    '''
+    
+    # Organize the data for spreadsheet output.
+    exporter= XlsFormExporter(survey, warnings)
 
     # Reorganize the data into multi-"sheet" CSV form and export.
     if path:
@@ -398,10 +698,16 @@ def to_csv(survey, path=None, warnings=None, koboform=False):
         csv_writer_kwargs= dict()
     csv_writer= csv.writer(filelike_obj, **csv_writer_kwargs)
     
-    # Write out the data sheet-by-sheet.
-    for sheet_name, sheet_rows in sheet_dict.iteritems():
+    # Write out the data sheet-by-sheet, streaming rows from the exporter.
+    header_renames= dict()
+    for sheet_name, sheet_rows in exporter.iter_sheets():
         # Prepend in a row containing just the sheet's name.
         csv_writer.writerow([sheet_name])
+        header_row= next(sheet_rows)
+        if koboform and (sheet_name == constants.SURVEY):
+            # The 'survey' sheet's columns are complete once its header is generated.
+            header_renames= get_koboform_header_renames(header_row, warnings)
+        csv_writer.writerow([''] + [header_renames.get(column_name, column_name).encode('utf-8') for column_name in header_row])
         for row in sheet_rows:
             # Write out each row of data prepended with an empty cell and ensuring all cells are UTF-8 encoded.
             csv_writer.writerow([''] + [cell_data.encode('utf-8') for cell_data in row])
@@ -0,0 +1,408 @@
+"""
+Scaling benchmarks. These are not run with the tests, run them with
+python pyxform/tests/benchmarks.py [benchmark name ...]
+"""
+import os
+import sys
+import time
+from cStringIO import StringIO
+#Hack to make sure that pyxform is on the python import path
+parentdir = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, parentdir)
+from pyxform import survey_from
+from pyxform import xform_instance_parser
+from pyxform import survey_to_xlsform
+from pyxform.builder import create_survey_element_from_dict, \
+    create_survey_from_path
+from pyxform.xform2json import XFormToDictBuilder
+
+DIR = os.path.dirname(__file__)
+
+
+def timed(func, *args, **kwargs):
+    start = time.time()
+    func(*args, **kwargs)
+    return time.time() - start
+
+
+def calculates_in_groups_xform(calculate_count, per_group=100):
+    """
+    Return the XForm of a survey with calculate_count calculates split into
+    groups of per_group, each inside a group nested in another group.
+    """
+    groups = []
+    for g in range(calculate_count // per_group):
+        calculates = [{
+            u"type": u"calculate",
+            u"name": u"calculate_%d_%d" % (g, i),
+            u"bind": {u"calculate": u"%d + %d" % (g, i)},
+        } for i in range(per_group)]
+        groups.append({
+            u"type": u"group",
+            u"name": u"outer_%d" % g,
+            u"label": u"Outer %d" % g,
+            u"children": [{
+                u"type": u"group",
+                u"name": u"inner_%d" % g,
+                u"label": u"Inner %d" % g,
+                u"children": calculates,
+            }],
+        })
+    survey = create_survey_element_from_dict({
+        u"type": u"survey",
+        u"name": u"calculates",
+        u"id_string": u"calculates",
+        u"title": u"Calculates",
+        u"children": groups,
+    })
+    return survey._to_pretty_xml().encode("utf-8")
+
+
+def bench_xform_bind_list(sizes=(2500, 5000, 10000)):
+    """
+    Time importing the bindings of calculates nested in groups, which have
+    no body elements and are placed by _cleanup_bind_list.
+    """
+    previous = None
+    for size in sizes:
+        xform = calculates_in_groups_xform(size)
+        seconds = timed(XFormToDictBuilder, filelike_obj=StringIO(xform))
+        growth = "" if previous is None else " (x%.1f)" % (seconds / previous)
+        print "%6d calculates: %.3fs%s" % (size, seconds, growth)
+        previous = seconds
+
+
+def bench_xform_import(repeat=20):
+    """
+    Import throughput of the example XForms, one survey_from.xform call per
+    form and streamed through survey_from.xforms.
+    """
+    xforms = []
+    for filename in sorted(os.listdir(os.path.join(DIR, "example_xforms"))):
+        with open(os.path.join(DIR, "example_xforms", filename)) as f:
+            xform = f.read()
+        try:
+            survey_from.xform(filelike_obj=StringIO(xform))
+        except Exception:
+            # Not every example is importable yet.
+            continue
+        xforms.append(xform)
+    xforms *= repeat
+
+    def one_at_a_time():
+        for xform in xforms:
+            survey_from.xform(filelike_obj=StringIO(xform))
+
+    def streamed():
+        for survey in survey_from.xforms(StringIO(x) for x in xforms):
+            pass
+
+    for name, func in [("xform", one_at_a_time), ("xforms", streamed)]:
+        seconds = timed(func)
+        print "%6s: %d forms in %.3fs, %.1f forms/s" % (
+            name, len(xforms), seconds, len(xforms) / seconds)
+
+
+def example_xls_submissions(count):
+    """
+    Return count random submissions of the example_xls forms, made by their
+    submission generators.
+    """
+    generators = []
+    example_xls = os.path.join(DIR, "example_xls")
+    for filename in sorted(os.listdir(example_xls)):
+        try:
+            survey = create_survey_from_path(os.path.join(example_xls, filename))
+            generators.append(survey.submission_generator(seed=0))
+        except Exception:
+            # Not every example is a valid form.
+            continue
+    return [generators[i % len(generators)].submission(i)
+            for i in range(count)]
+
+
+def bench_submission_generator(count=5000):
+    """
+    Submissions per second generated for the widgets example in this process
+    and across a process pool.
+    """
+    survey = create_survey_from_path(
+        os.path.join(DIR, "example_xls", "widgets.xls"))
+    generator = survey.submission_generator(seed=0)
+    for name, processes in [("1 process", 1), ("pool", None)]:
+        seconds = timed(list, generator.generate(count, processes=processes))
+        print "%10s: %.0f submissions/s" % (name, count / seconds)
+
+
+def bench_submission_parsing(count=5000):
+    """
+    Submissions per second parsed with the DOM parser, the iterparse parser
+    and parse_xform_instances in this process and across a process pool.
+    """
+    submissions = example_xls_submissions(count)
+
+    def serial(parse):
+        for submission in submissions:
+            parse(submission)
+
+    def batch(**kwargs):
+        for result in xform_instance_parser.parse_xform_instances(
+                submissions, **kwargs):
+            pass
+
+    runs = [
+        ("parse_xform_instance", serial,
+         [xform_instance_parser.parse_xform_instance], {}),
+        ("iterparse_xform_instance", serial,
+         [xform_instance_parser.iterparse_xform_instance], {}),
+        ("batch, 1 process", batch, [], {"processes": 1}),
+        ("batch, pool", batch, [], {}),
+        ("batch, pool, unordered", batch, [], {"ordered": False}),
+    ]
+    for name, func, args, kwargs in runs:
+        seconds = timed(func, *args, **kwargs)
+        print "%26s: %.0f submissions/s" % (name, count / seconds)
+
+
+def bench_submission_export(counts=(2000, 8000)):
+    """
+    Rows per second exported to CSV from submissions with repeats, and the
+    peak memory of the process, which shouldn't grow with the submission
+    count since submissions are streamed.
+    """
+    import resource
+    import tempfile
+    import shutil
+    survey = create_survey_element_from_dict({
+        u"type": u"survey",
+        u"name": u"household",
+        u"id_string": u"household",
+        u"children": [
+            {u"type": u"integer", u"name": u"size", u"label": u"Size"},
+            {u"type": u"repeat", u"name": u"member", u"label": u"Member",
+             u"children": [
+                 {u"type": u"text", u"name": u"name", u"label": u"Name"},
+                 {u"type": u"decimal", u"name": u"age", u"label": u"Age"}]},
+        ],
+    })
+    member = "<member><name>Member %d</name><age>%d.5</age></member>"
+    export = survey.submission_export()
+    for count in counts:
+        submissions = (
+            "<household><size>10</size>%s</household>" % "".join(
+                [member % (m, i) for m in range(10)])
+            for i in xrange(count))
+        directory = tempfile.mkdtemp()
+        try:
+            seconds = timed(export.write_csv, submissions, directory)
+        finally:
+            shutil.rmtree(directory)
+        print "%6d submissions: %.0f rows/s, peak memory %d KB" % (
+            count, count * 11 / seconds,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def bench_instance_writer(count=20000):
+    """
+    Submissions per second written by an InstanceWriter for a survey with a
+    group and a repeat.
+    """
+    survey = create_survey_element_from_dict({
+        u"type": u"survey",
+        u"name": u"household",
+        u"id_string": u"household",
+        u"children": [
+            {u"type": u"text", u"name": u"name", u"label": u"Name"},
+            {u"type": u"group", u"name": u"place", u"label": u"Place",
+             u"children": [{u"type": u"text", u"name": u"village",
+                            u"label": u"Village"}]},
+            {u"type": u"repeat", u"name": u"member", u"label": u"Member",
+             u"children": [{u"type": u"integer", u"name": u"age",
+                            u"label": u"Age"}]},
+        ],
+    })
+    writer = survey.instance_writer()
+    answers = {u"name": u"Smith & Sons", u"village": u"Zo\xeb",
+               u"member": [{u"age": age} for age in range(5)]}
+
+    def write():
+        f = StringIO()
+        for i in xrange(count):
+            writer.write(answers, f)
+
+    print "%.0f submissions/s" % (count / timed(write))
+
+
+def translated_choices_survey(choice_count, language_count=300,
+                              per_question=100):
+    """
+    Return a survey of select one questions with choice_count choices in
+    total, per_question each, labelled in language_count languages.
+    """
+    languages = [u"language_%d" % l for l in range(language_count)]
+
+    def label(name):
+        return dict((language, u"%s %s" % (name, language))
+                    for language in languages)
+
+    questions = []
+    for q in range(choice_count // per_question):
+        questions.append({
+            u"type": u"select one",
+            u"name": u"question_%d" % q,
+            u"label": label(u"Question %d" % q),
+            u"choices": [{u"name": u"choice_%d" % c,
+                          u"label": label(u"Choice %d.%d" % (q, c))}
+                         for c in range(per_question)],
+        })
+    return create_survey_element_from_dict({
+        u"type": u"survey",
+        u"name": u"choices",
+        u"id_string": u"choices",
+        u"children": questions,
+    })
+
+
+def bench_xlsform_export(sizes=(2500, 5000, 10000)):
+    """
+    Time organizing surveys with 300 label translations into XLSForm sheets
+    as the number of choices grows.
+    """
+    previous = None
+    for size in sizes:
+        survey = translated_choices_survey(size)
+        seconds = timed(survey_to_xlsform.XlsFormExporter, survey)
+        growth = "" if previous is None else " (x%.1f)" % (seconds / previous)
+        print "%6d choices: %.3fs%s" % (size, seconds, growth)
+        previous = seconds
+
+
+def bench_xlsx_export(choice_count=100000):
+    """
+    Time exporting a survey whose choices sheet is beyond the XLS row limit
+    to XLSX, which to_xls refuses.
+    """
+    survey = translated_choices_survey(choice_count, language_count=2)
+    try:
+        survey_to_xlsform.to_xls(survey)
+    except Exception as e:
+        print "to_xls: %s" % e
+    seconds = timed(survey_to_xlsform.to_xlsx, survey)
+    print "to_xlsx: %d choices in %.3fs" % (choice_count, seconds)
+
+
+def bench_csv_export(choice_count=200000):
+    """
+    Time and peak memory growth of exporting a survey with many choices to
+    CSV, which streams the survey sheet and spills buffered choices to a
+    temporary file.
+    """
+    import resource
+    import tempfile
+    survey = translated_choices_survey(choice_count, language_count=2)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.NamedTemporaryFile(suffix=".csv") as f:
+        seconds = timed(survey_to_xlsform.to_csv, survey, f.name)
+    growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    print "to_csv: %d choices in %.3fs, peak memory +%d KB" % (
+        choice_count, seconds, growth)
+
+
+def bench_section_library(form_count=200, module_count=5, question_count=60):
+    """
+    Time building forms that each include the same standard modules, from
+    their dicts and from a SectionLibrary.
+    """
+    from pyxform.builder import create_survey
+    from pyxform.section_library import SectionLibrary
+    sections = {}
+    for m in range(module_count):
+        sections[u"module%d" % m] = {
+            u"type": u"survey", u"name": u"module%d" % m,
+            u"children": [{u"type": u"repeat", u"name": u"roster%d" % m,
+                           u"label": u"Roster",
+                           u"children": [
+                               {u"type": u"select one", u"name": u"q%d" % q,
+                                u"label": u"Question %d" % q,
+                                u"choices": [{u"name": u"yes",
+                                              u"label": u"Yes"},
+                                             {u"name": u"no",
+                                              u"label": u"No"}]}
+                               for q in range(question_count)]}]}
+    sections[u"form"] = {
+        u"type": u"survey", u"name": u"form",
+        u"children": [{u"type": u"include", u"name": u"module%d" % m}
+                      for m in range(module_count)]}
+
+    def build(library=None):
+        for i in range(form_count):
+            create_survey(u"form", sections, library=library)
+    print "from dicts: %d forms in %.3fs" % (form_count, timed(build))
+    print "from library: %d forms in %.3fs" % (
+        form_count, timed(build, SectionLibrary()))
+
+
+def bench_loop_expansion(column_count=200, question_count=30):
+    """
+    Time building a survey with a loop of question_count questions over
+    column_count columns, with labels in two languages.
+    """
+    survey_dict = {
+        u"type": u"survey", u"name": u"loops", u"id_string": u"loops",
+        u"children": [{
+            u"type": u"loop", u"name": u"items",
+            u"columns": [{u"name": u"item%d" % c,
+                          u"label": {u"English": u"Item %d" % c,
+                                     u"French": u"Article %d" % c}}
+                         for c in range(column_count)],
+            u"children": [{u"type": u"integer", u"name": u"q%d" % q,
+                           u"label": {
+                               u"English": u"How many %%(label)s? %d" % q,
+                               u"French": u"Combien %%(label)s? %d" % q},
+                           u"bind": {u"constraint": u". >= 0"}}
+                          for q in range(question_count)]}]}
+    seconds = timed(create_survey_element_from_dict, survey_dict)
+    print "%d questions x %d columns in %.3fs" % (
+        question_count, column_count, seconds)
+
+
+def bench_cascade_sheet(row_count=50000):
+    """
+    Time reading a workbook with a 5 level location cascades sheet of
+    row_count rows.
+    """
+    import tempfile
+    import xlwt
+    from pyxform.xls2json_backends import xls_to_dict
+    levels = [u"country", u"region", u"district", u"ward", u"village"]
+    workbook = xlwt.Workbook()
+    sheet = workbook.add_sheet(u"cascades")
+    for column, value in enumerate([u"name"] + levels):
+        sheet.write(0, column, value)
+    for column, value in enumerate([u"label"] + levels):
+        sheet.write(1, column, value.title())
+    for row in range(row_count):
+        sheet.write(row + 2, 0, u"choice_label")
+        # 5 countries of 10 regions of 10 districts of 10 wards, each
+        # ward with row_count / 5000 villages.
+        path = [row * 5 // row_count, row * 50 // row_count,
+                row * 500 // row_count, row * 5000 // row_count, row]
+        for column, (level, number) in enumerate(zip(levels, path)):
+            sheet.write(row + 2, column + 1, u"%s %d" % (level, number))
+    with tempfile.NamedTemporaryFile(suffix=".xls") as f:
+        workbook.save(f.name)
+        start = time.time()
+        choices = xls_to_dict(f.name)[u"cascades"][0][u"choices"]
+        print "%d rows, %d choices in %.3fs" % (
+            row_count, len(choices), time.time() - start)
+
+
+BENCHMARKS = dict((name[len("bench_"):], func)
+                  for name, func in globals().items()
+                  if name.startswith("bench_"))
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or sorted(BENCHMARKS):
+        print name
+        BENCHMARKS[name]()
@@ -1,4 +1,10 @@
+import json
+import os
+import shutil
+import tempfile
 from unittest import TestCase
+from pyxform import file_utils
+from pyxform.builder import create_survey_from_path
 from pyxform.xls2json_backends import convert_file_to_csv_string
 import utils
 
@@ -14,3 +20,94 @@ class BackendUtilsTests(TestCase):
         # print converted_xls
         self.assertEqual(converted_csv, converted_xls)
 
+
+
+class IncludedSectionsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self._write_section("main", [
+            {u"type": u"include", u"name": u"household"},
+            {u"type": u"include", u"name": u"person"}])
+        self._write_section("household", [
+            {u"type": u"integer", u"name": u"members", u"label": u"Members"},
+            {u"type": u"include", u"name": u"address"}])
+        self._write_section("person", [
+            {u"type": u"text", u"name": u"name", u"label": u"Name"}])
+        self._write_section("address", [
+            {u"type": u"text", u"name": u"street", u"label": u"Street"}])
+        # Not included, so never read.
+        with open(os.path.join(self.directory, "broken.xls"), "wb") as f:
+            f.write("not a spreadsheet")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write_section(self, name, children):
+        with open(os.path.join(self.directory, name + ".json"), "w") as f:
+            json.dump({u"type": u"survey", u"name": name,
+                       u"children": children}, f)
+
+    def test_only_included_sections_are_loaded(self):
+        main_name, main = file_utils.load_file_to_dict(
+            os.path.join(self.directory, "main.json"))
+        sections = file_utils.collect_included_sections(
+            self.directory, main, processes=2)
+        self.assertEqual(sorted(sections.keys()),
+                         [u"address", u"household", u"person"])
+        survey = create_survey_from_path(
+            os.path.join(self.directory, "main.json"), include_directory=True)
+        self.assertEqual([child.name for child in survey.children],
+                         [u"members", u"street", u"name"])
+
+    def test_sections_are_cached(self):
+        path = os.path.join(self.directory, "person.json")
+        first = file_utils.load_files_to_dicts([path])
+        first[u"person"][u"children"].append({})
+        self.assertEqual(len(file_utils.load_files_to_dicts(
+            [path])[u"person"][u"children"]), 1)
+
+    def test_cached_sections_are_verified_when_touched(self):
+        path = os.path.join(self.directory, "person.json")
+        file_utils.load_files_to_dicts([path])
+        calls = []
+        load_file_to_dict = file_utils.load_file_to_dict
+        file_digest = file_utils._file_digest
+        def counted(function, name):
+            def wrapper(path):
+                calls.append(name)
+                return function(path)
+            return wrapper
+        file_utils.load_file_to_dict = counted(load_file_to_dict, "load")
+        file_utils._file_digest = counted(file_digest, "digest")
+        try:
+            # Unchanged mtime and size: the file is not read.
+            file_utils.load_files_to_dicts([path])
+            self.assertEqual(calls, [])
+            # Touched but unchanged: the file is hashed, not parsed.
+            stat = os.stat(path)
+            os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+            file_utils.load_files_to_dicts([path])
+            self.assertEqual(calls, ["digest"])
+            # Changed: the file is parsed again.
+            del calls[:]
+            self._write_section("person", [
+                {u"type": u"text", u"name": u"name", u"label": u"Nome"}])
+            os.utime(path, (stat.st_atime, stat.st_mtime + 20))
+            sections = file_utils.load_files_to_dicts([path])
+            self.assertEqual(calls, ["digest", "load"])
+            self.assertEqual(
+                sections[u"person"][u"children"][0][u"label"], u"Nome")
+        finally:
+            file_utils.load_file_to_dict = load_file_to_dict
+            file_utils._file_digest = file_digest
+
+    def test_section_cache_is_bounded(self):
+        paths = [os.path.join(self.directory, name + ".json")
+                 for name in ["main", "household", "person", "address"]]
+        cache_size = file_utils.SECTION_CACHE_SIZE
+        file_utils.SECTION_CACHE_SIZE = 2
+        try:
+            file_utils.load_files_to_dicts(paths)
+            self.assertEqual(file_utils._section_cache.keys(), paths[2:])
+        finally:
+            file_utils.SECTION_CACHE_SIZE = cache_size
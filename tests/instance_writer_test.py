@@ -0,0 +1,73 @@
+"""
+Test writing submissions with Survey.instance_writer.
+"""
+from unittest import TestCase
+from cStringIO import StringIO
+
+from pyxform.builder import create_survey_element_from_dict
+
+
+class InstanceWriterTests(TestCase):
+
+    def setUp(self):
+        self.survey = create_survey_element_from_dict({
+            u"type": u"survey",
+            u"name": u"household",
+            u"id_string": u"household_1",
+            u"children": [
+                {u"type": u"text", u"name": u"name", u"label": u"Name"},
+                {u"type": u"integer", u"name": u"size", u"label": u"Size",
+                 u"default": u"1"},
+                {u"type": u"group", u"name": u"place", u"label": u"Place",
+                 u"children": [
+                     {u"type": u"text", u"name": u"village",
+                      u"label": u"Village"}]},
+                {u"type": u"repeat", u"name": u"member", u"label": u"Member",
+                 u"children": [
+                     {u"type": u"text", u"name": u"first_name",
+                      u"label": u"First name"}]},
+            ],
+        })
+        self.writer = self.survey.instance_writer()
+
+    def write(self, answers):
+        f = StringIO()
+        self.writer.write(answers, f)
+        return f.getvalue()
+
+    def test_nesting_and_escaping(self):
+        self.assertEqual(self.write({
+            u"name": u"Smith & <Sons>",
+            u"size": 2,
+            u"village": u"Zo\xeb",
+            u"member": [{u"first_name": u"Ann"}, {u"first_name": None}],
+        }), "<?xml version='1.0' ?>"
+            '<household id="household_1">'
+            "<name>Smith &amp; &lt;Sons&gt;</name>"
+            "<size>2</size>"
+            "<place><village>Zo\xc3\xab</village></place>"
+            "<member><first_name>Ann</first_name></member>"
+            "<member><first_name/></member>"
+            "</household>")
+
+    def test_defaults_and_no_repeats(self):
+        self.assertEqual(self.write({}), "<?xml version='1.0' ?>"
+            '<household id="household_1">'
+            "<name/><size>1</size><place><village/></place>"
+            "</household>")
+
+    def test_instance_to_xml(self):
+        instance = self.survey.instantiate()
+        instance.answer(name=u"name", value=u"Smith")
+        instance.answer(name=u"size", value=None)
+        self.assertEqual(instance.to_xml(), u"<?xml version='1.0' ?>"
+            u'<household id="household_1">'
+            u"<name>Smith</name><size/><place><village/></place>"
+            u"</household>")
+
+    def test_writer_is_cached(self):
+        instance = self.survey.instantiate()
+        instance.to_xml()
+        self.assertIs(self.survey.instance_writer(), self.writer)
+        self.survey._setup_xpath_dictionary()
+        self.assertIsNot(self.survey.instance_writer(), self.writer)
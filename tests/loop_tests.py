@@ -1,5 +1,6 @@
 from unittest import TestCase
-from pyxform.builder import create_survey_from_xls
+from pyxform.builder import create_survey_from_xls, \
+    create_survey_element_from_dict
 from pyxform.errors import ValidationError
 import utils
 
@@ -101,3 +102,28 @@ class LoopTests(TestCase):
             self.fail("survey.to_xml() raised ValidationError.")
         # not sure what expected_xml should be in this case
         #self.assertEquals(actual_xml, expected_xml)
+
+    def test_loop_substitutions(self):
+        survey = create_survey_element_from_dict({
+            u'type': u'survey', u'name': u'loops',
+            u'children': [{
+                u'type': u'loop', u'name': u'vehicles',
+                u'columns': [
+                    {u'name': u'car',
+                     u'label': {u'English': u'Car', u'French': u'Voiture'}},
+                    {u'name': u'bike',
+                     u'label': {u'English': u'Bike', u'French': u'Velo'}}],
+                u'children': [{
+                    u'type': u'integer', u'name': u'total',
+                    u'label': {u'English': u'How many %(label)s?',
+                               u'French': u'Combien de %(label)s?'},
+                    u'hint': u'Count every %(name)s.',
+                    u'bind': {u'constraint': u'. >= 0'}}]}]})
+        car, bike = survey.children[0].children
+        self.assertEqual(car.children[0].label, {
+            u'English': u'How many Car?', u'French': u'Combien de Voiture?'})
+        self.assertEqual(bike.children[0].label, {
+            u'English': u'How many Bike?', u'French': u'Combien de Velo?'})
+        self.assertEqual(bike.children[0].hint, u'Count every bike.')
+        self.assertEqual(car.children[0].bind, bike.children[0].bind)
+        self.assertIsNot(car.children[0].bind, bike.children[0].bind)
@@ -0,0 +1,105 @@
+"""
+Test including sections from a section_library.SectionLibrary.
+"""
+import copy
+import shutil
+import tempfile
+from unittest import TestCase
+
+from pyxform.builder import SurveyElementBuilder, create_survey
+from pyxform.errors import PyXFormError
+from pyxform.section_library import SectionLibrary
+
+
+def _sections():
+    return {
+        u"main": {
+            u"type": u"survey", u"name": u"main",
+            u"children": [
+                {u"type": u"include", u"name": u"roster"},
+                {u"type": u"text", u"name": u"comment", u"label": u"Comment"},
+            ]},
+        u"roster": {
+            u"type": u"survey", u"name": u"roster",
+            u"children": [
+                {u"type": u"repeat", u"name": u"member", u"label": u"Member",
+                 u"children": [
+                     {u"type": u"text", u"name": u"name", u"label": u"Name"},
+                     {u"type": u"integer", u"name": u"age", u"label": u"Age"},
+                 ]},
+            ]},
+    }
+
+
+class SectionLibraryTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_include_from_library(self):
+        expected = create_survey(u"main", _sections())
+        library = SectionLibrary()
+        first = create_survey(u"main", _sections(), library=library)
+        second = create_survey(u"main", _sections(), library=library)
+        self.assertEqual(first._to_pretty_xml(), expected._to_pretty_xml())
+        self.assertEqual(second._to_pretty_xml(), expected._to_pretty_xml())
+        self.assertIsNot(first.children[0], second.children[0])
+        self.assertIs(second.children[0].parent, second)
+
+    def test_persistent_library(self):
+        expected = create_survey(u"main", _sections())
+        create_survey(u"main", _sections(),
+                      library=SectionLibrary(self.directory))
+        library = SectionLibrary(self.directory)
+        roster = _sections()[u"roster"]
+        builder = SurveyElementBuilder(sections=_sections())
+        self.assertTrue(library.contains(roster, builder))
+        survey = create_survey(u"main", _sections(), library=library)
+        self.assertEqual(survey._to_pretty_xml(), expected._to_pretty_xml())
+        roster[u"children"].append(
+            {u"type": u"text", u"name": u"notes", u"label": u"Notes"})
+        self.assertFalse(library.contains(roster, builder))
+
+    def test_nested_includes_are_part_of_the_key(self):
+        sections = _sections()
+        sections[u"roster"][u"children"].append(
+            {u"type": u"include", u"name": u"contact"})
+        sections[u"contact"] = {
+            u"type": u"survey", u"name": u"contact",
+            u"children": [
+                {u"type": u"text", u"name": u"phone", u"label": u"Phone"}]}
+        library = SectionLibrary()
+        create_survey(u"main", copy.deepcopy(sections), library=library)
+        sections[u"contact"][u"children"][0][u"label"] = u"Mobile"
+        survey = create_survey(u"main", sections, library=library)
+        phone = [e for e in survey.children if e.name == u"phone"][0]
+        self.assertEqual(phone.label, u"Mobile")
+
+    def test_section_digests_are_kept_per_builder(self):
+        sections = _sections()
+        builder = SurveyElementBuilder(sections=sections)
+        key = SectionLibrary.section_key(sections[u"roster"], builder)
+        self.assertEqual(builder._section_digests.keys(), [u"roster"])
+        self.assertEqual(
+            SectionLibrary.section_key(copy.deepcopy(sections[u"roster"]),
+                                       builder), key)
+        builder.set_sections(_sections())
+        self.assertEqual(builder._section_digests, {})
+
+    def test_builder_options_are_part_of_the_key(self):
+        roster = _sections()[u"roster"]
+        library = SectionLibrary()
+        library.add(roster, SurveyElementBuilder(sections=_sections()))
+        builder = SurveyElementBuilder(sections=_sections())
+        builder._add_none_option = True
+        self.assertFalse(library.contains(roster, builder))
+
+    def test_sections_are_validated(self):
+        sections = _sections()
+        sections[u"roster"][u"children"].append(
+            {u"type": u"text", u"name": u"member", u"label": u"Member"})
+        with self.assertRaises(PyXFormError):
+            create_survey(u"main", sections, library=SectionLibrary())
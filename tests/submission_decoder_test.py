@@ -0,0 +1,65 @@
+"""
+Test decoding submissions with Survey.submission_decoder.
+"""
+from datetime import date
+from unittest import TestCase
+
+from pyxform.builder import create_survey_element_from_dict
+from pyxform.errors import PyXFormError
+
+
+def _question(question_type, name):
+    question = {u"type": question_type, u"name": name, u"label": name}
+    if question_type == u"select all that apply":
+        question[u"choices"] = [{u"name": u"a", u"label": u"A"},
+                                {u"name": u"b", u"label": u"B"}]
+    return question
+
+
+class SubmissionDecoderTests(TestCase):
+
+    def setUp(self):
+        survey = create_survey_element_from_dict({
+            u"type": u"survey",
+            u"name": u"census",
+            u"id_string": u"census",
+            u"children": [
+                _question(u"integer", u"age"),
+                _question(u"decimal", u"height"),
+                {u"type": u"group", u"name": u"visit", u"label": u"Visit",
+                 u"children": [_question(u"date", u"day"),
+                               _question(u"geopoint", u"place")]},
+                {u"type": u"repeat", u"name": u"child", u"label": u"Child",
+                 u"children": [_question(u"text", u"name"),
+                               _question(u"select all that apply",
+                                         u"toys")]},
+            ],
+        })
+        self.decoder = survey.submission_decoder()
+
+    def test_columns(self):
+        self.assertEqual(self.decoder.columns, [
+            u"age", u"height", u"visit/day", u"visit/place", u"child"])
+        self.assertEqual(self.decoder.repeats[u"child"].columns,
+                         [u"child/name", u"child/toys"])
+
+    def test_decode(self):
+        record = self.decoder.decode("""<?xml version='1.0' ?>
+            <census id="census" xmlns:orx="http://openrosa.org/xforms">
+              <age>7</age>
+              <height></height>
+              <visit>
+                <day>2014-09-17</day>
+                <place>1.5 -2.5 10 5</place>
+              </visit>
+              <child><name>Ann</name><toys>a b</toys></child>
+              <child><name>Bob</name><unknown>skipped</unknown></child>
+              <orx:meta><orx:instanceID>uuid:1</orx:instanceID></orx:meta>
+            </census>""")
+        self.assertEqual(record, [
+            7, None, date(2014, 9, 17), (1.5, -2.5, 10.0, 5.0),
+            [[u"Ann", [u"a", u"b"]], [u"Bob", None]]])
+
+    def test_invalid_value(self):
+        with self.assertRaises(PyXFormError):
+            self.decoder.decode("<census><age>seven</age></census>")
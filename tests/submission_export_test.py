@@ -0,0 +1,117 @@
+"""
+Test exporting submissions with Survey.submission_export.
+"""
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import TestCase
+from cStringIO import StringIO
+
+from pyxform.builder import create_survey_element_from_dict
+from pyxform.errors import PyXFormError
+
+
+def _question(question_type, name):
+    return {u"type": question_type, u"name": name, u"label": name}
+
+
+SUBMISSIONS = [
+    """<household>
+      <size>2</size>
+      <visit>2014-09-17</visit>
+      <member><name>Ann</name><pet><kind>cat</kind></pet><pet><kind>dog</kind></pet></member>
+      <member><name>Bob</name></member>
+    </household>""",
+    """<household>
+      <size></size>
+      <member><name>Zo\xc3\xab, "Z"</name><pet><kind>fish</kind></pet></member>
+    </household>""",
+]
+
+
+class SubmissionExportTests(TestCase):
+
+    def setUp(self):
+        survey = create_survey_element_from_dict({
+            u"type": u"survey",
+            u"name": u"household",
+            u"id_string": u"household",
+            u"children": [
+                _question(u"integer", u"size"),
+                _question(u"date", u"visit"),
+                {u"type": u"repeat", u"name": u"member", u"label": u"Member",
+                 u"children": [
+                     _question(u"text", u"name"),
+                     {u"type": u"repeat", u"name": u"pet", u"label": u"Pet",
+                      u"children": [_question(u"text", u"kind")]}]},
+            ],
+        })
+        self.export = survey.submission_export()
+
+    def test_columns(self):
+        self.assertEqual(self.export.columns(), {
+            u"household": [u"_index", u"size", u"visit"],
+            u"member": [u"_index", u"_parent_index", u"member/name"],
+            u"member/pet": [u"_index", u"_parent_index", u"member/pet/kind"],
+        })
+
+    def test_to_arrays(self):
+        self.assertEqual(self.export.to_arrays(SUBMISSIONS), {
+            u"household": {
+                u"_index": [1, 2],
+                u"size": [2, None],
+                u"visit": [date(2014, 9, 17), None],
+            },
+            u"member": {
+                u"_index": [1, 2, 3],
+                u"_parent_index": [1, 1, 2],
+                u"member/name": [u"Ann", u"Bob", u"Zo\xeb, \"Z\""],
+            },
+            u"member/pet": {
+                u"_index": [1, 2, 3],
+                u"_parent_index": [1, 1, 3],
+                u"member/pet/kind": [u"cat", u"dog", u"fish"],
+            },
+        })
+
+    def test_to_numpy_arrays(self):
+        try:
+            import numpy
+        except ImportError:
+            self.assertRaises(PyXFormError, self.export.to_arrays,
+                              SUBMISSIONS, numpy=True)
+            return
+        arrays = self.export.to_arrays(SUBMISSIONS, numpy=True)
+        size = arrays[u"household"][u"size"]
+        self.assertEqual(size.dtype, numpy.float64)
+        self.assertEqual(size[0], 2)
+        self.assertTrue(numpy.isnan(size[1]))
+        self.assertEqual(list(arrays[u"member"][u"member/name"]),
+                         [u"Ann", u"Bob", u"Zo\xeb, \"Z\""])
+
+    def test_write_csv(self):
+        files = dict((name, StringIO()) for name in self.export.columns())
+        self.export.write_csv(iter(SUBMISSIONS), files)
+        self.assertEqual(files[u"household"].getvalue().splitlines(), [
+            '"_index","size","visit"',
+            '"1","2","2014-09-17"',
+            '"2","",""',
+        ])
+        self.assertEqual(files[u"member"].getvalue().splitlines(), [
+            '"_index","_parent_index","member/name"',
+            '"1","1","Ann"',
+            '"2","1","Bob"',
+            '"3","2","Zo\xc3\xab, ""Z"""',
+        ])
+
+    def test_write_csv_to_directory(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.export.write_csv(SUBMISSIONS, directory)
+            self.assertEqual(sorted(os.listdir(directory)), [
+                "household.csv", "member.csv", "member.pet.csv"])
+            with open(os.path.join(directory, "member.pet.csv")) as f:
+                self.assertEqual(f.read().splitlines()[-1], '"3","3","fish"')
+        finally:
+            shutil.rmtree(directory)
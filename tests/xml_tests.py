@@ -17,15 +17,15 @@ class XMLTests(TestCase):
     <model>
       <itext>
         <translation lang="english">
-          <text id="/yes_or_no_question/good_day:label">
-            <value>have you had a good day today?</value>
-          </text>
           <text id="/yes_or_no_question/good_day/no:label">
             <value>no</value>
           </text>
           <text id="/yes_or_no_question/good_day/yes:label">
             <value>yes</value>
           </text>
+          <text id="/yes_or_no_question/good_day:label">
+            <value>have you had a good day today?</value>
+          </text>
         </translation>
       </itext>
       <instance>
@@ -5,7 +5,6 @@ import re
 import json
 import copy
 import codecs
-from operator import itemgetter
 
 from lxml import etree
 from lxml.etree import ElementTree
@@ -170,6 +169,52 @@ def ConvertXmlToDict(root, dictclass=XmlDictObject):
 ## end of http://code.activestate.com/recipes/573463/ }}}
 
 
+def _ConvertXmlToLocalNameDictRecurse(node):
+    nodedict = {}
+
+    for name, value in node.items():
+        nodedict[etree.QName(name).localname] = unicode(value)
+
+    for child in node.iterchildren(tag=etree.Element):
+        newitem = _ConvertXmlToLocalNameDictRecurse(child)
+        if child.tail is not None and child.tail.strip() != '':
+            newitem['tail'] = unicode(child.tail)
+        tag = etree.QName(child).localname
+        if tag in nodedict:
+            if isinstance(nodedict[tag], list):
+                nodedict[tag].append(newitem)
+            else:
+                nodedict[tag] = [nodedict[tag], newitem]
+        else:
+            nodedict[tag] = newitem
+
+    text = u'' if node.text is None else unicode(node.text.strip())
+
+    if len(nodedict) > 0:
+        if len(text) > 0:
+            nodedict['_text'] = text
+    else:
+        nodedict = text
+
+    return nodedict
+
+
+def ConvertXmlToLocalNameDict(root):
+    """
+    Like ConvertXmlToDict but builds plain dictionaries keyed by the local
+    names of the tags and attributes, i.e. with their namespaces stripped, in
+    a single pass over the tree.
+    """
+    return {etree.QName(root).localname:
+            _ConvertXmlToLocalNameDictRecurse(root)}
+
+
+def _get_child_element(element, localname):
+    for child in element.iterchildren(tag=etree.Element):
+        if etree.QName(child).localname == localname:
+            return child
+
+
 def create_survey_element_from_xml(xml_file):
     sb = XFormToDictBuilder(xml_file)
     return sb.survey()
@@ -189,9 +234,9 @@ class XFormToDictBuilder:
         if path:
             assert os.path.isfile(path)
             with open(path) as f:
-                doc_as_dict= self.get_dict_from_xml(f)
+                xml_root= self.get_xml_root(f)
         elif filelike_obj:
-            doc_as_dict= self.get_dict_from_xml(filelike_obj)
+            xml_root= self.get_xml_root(filelike_obj)
         else:
             raise RuntimeError('\'XFormToDictBuilder()\' requires either the '\
                                + '\'path\' or the \'filelike_obj\' parameter.')
@@ -203,6 +248,7 @@ class XFormToDictBuilder:
             self.warnings= list()
         self.warnings.append(XFORM_IMPORT_WARNING)
 
+        doc_as_dict= ConvertXmlToLocalNameDict(xml_root)
         assert 'html' in doc_as_dict
         assert 'body' in doc_as_dict['html']
         assert 'head' in doc_as_dict['html']
@@ -211,11 +257,22 @@ class XFormToDictBuilder:
         assert constants.BIND in doc_as_dict['html']['head'][constants.MODEL_XFORM]
 
         self.body = doc_as_dict['html']['body']
+        self._body_element = _get_child_element(xml_root, 'body')
+        self._model_element = _get_child_element(
+            _get_child_element(xml_root, 'head'), constants.MODEL_XFORM)
         self.model = doc_as_dict['html']['head'][constants.MODEL_XFORM]
         self.bindings = copy.deepcopy(self.model[constants.BIND])
         if isinstance(self.bindings, dict):
             self.bindings= [self.bindings]
-        self._bind_list = copy.deepcopy(self.bindings)
+        self._bindings_by_nodeset = {}
+        self._bindings_by_id = {}
+        for binding in self.bindings:
+            self._bindings_by_nodeset.setdefault(
+                binding[constants.NODESET_XFORM], binding)
+            if 'id' in binding:
+                self._bindings_by_id.setdefault(binding['id'], binding)
+        # Nodesets of the bindings already turned into questions.
+        self._bound_nodesets = set()
         self.title = doc_as_dict['html']['head'][constants.TITLE]
         # FIXME: Brittle workaround for titles with translations that also provide default text (old KF).
         if isinstance(self.title, dict):
@@ -230,44 +287,29 @@ class XFormToDictBuilder:
         }
         self._set_submission_info()
         self._set_survey_name()
-        self.children = []
-        self.ordered_binding_refs = []
-        self._set_binding_order()
 
         # set self.translations
         self._set_translations()
 
-        for body_element_tag, body_element in self.body.iteritems():
-            if isinstance(body_element, dict):
-                self.children.append(
-                        self._get_question_from_object(body_element, \
-                                element_tag=body_element_tag))
-            elif isinstance(body_element, list):
-                for sub_element in body_element:
-                    self.children.append(
-                        self._get_question_from_object(sub_element, \
-                                element_tag=body_element_tag))
+        # The body is walked in document order, so questions and groups keep
+        # the order they are displayed in.
+        self.children = self._get_children_questions(
+            self.body, self._body_element)
         self._cleanup_bind_list()
         self._cleanup_children()
         self.new_doc[constants.CHILDREN] = self.children
 
 
     @staticmethod
-    def get_dict_from_xml(xml_file_object):
+    def get_xml_root(xml_file_object):
         parser = etree.XMLParser(remove_comments=True)
-        xml_root= etree.parse(xml_file_object, parser=parser).getroot()
-        xml_dict= ConvertXmlToDict(xml_root)
-        
-        json_str = json.dumps(xml_dict)
-        for k in xml_root.nsmap:
-            json_str = json_str.replace('{%s}' % xml_root.nsmap[k], '')
-        return json.loads(json_str)
+        return etree.parse(xml_file_object, parser=parser).getroot()
 
+    @staticmethod
+    def get_dict_from_xml(xml_file_object):
+        return ConvertXmlToLocalNameDict(
+            XFormToDictBuilder.get_xml_root(xml_file_object))
 
-    def _set_binding_order(self):
-        self.ordered_binding_refs = []
-        for bind in self.bindings:
-            self.ordered_binding_refs.append(bind[constants.NODESET_XFORM])
 
     def _set_survey_name(self):
         obj = self.bindings[0]
@@ -301,106 +343,155 @@ class XFormToDictBuilder:
                         del child[constants.NODESET_XFORM]
                     if constants.REF_XFORM in child:
                         del child[constants.REF_XFORM]
-                    if '__order' in child:
-                        del child['__order']
                     if constants.CHILDREN in child:
                         remove_refs(child[constants.CHILDREN])
 
-        # do some ordering, order is specified by bindings
-        def order_children(children):
-            if isinstance(children, list):
-                try:
-                    children.sort(key=itemgetter('__order'))
-                except KeyError:
-                    pass
-                for child in children:
-                    if isinstance(child, dict) and 'children' in child:
-                        order_children(child['children'])
-        order_children(self.children)
         remove_refs(self.children)
 
     def _cleanup_bind_list(self):
-        for bndng in self._bind_list:
-            ref = bndng['nodeset']
-            name = self._get_name_from_ref(ref)
-            parent_ref = ref[:ref.find('/%s' % name)]
-            question = self._get_question_params_from_bindings(ref)
-            question[constants.NAME] = name
-            question['__order'] = self._get_question_order(ref)
-            if 'calculate' in bndng:
-                question['type'] = 'calculate'
-            if ref.split('/').__len__() == 3:
-                # just append on root node, has no group
-                question['ref'] = ref
-                self.children.append(question)
+        # Questions that only have a binding (e.g. calculates) are added to
+        # the group their nodeset is in, creating any group missing from the
+        # body. Nodes are looked up by ref rather than by searching children.
+        nodes = {}
+        pending = list(self.children)
+        while pending:
+            node = pending.pop()
+            if isinstance(node, dict) and 'ref' in node:
+                nodes.setdefault(node['ref'], node)
+                pending.extend(node.get(constants.CHILDREN, []))
+
+        # Each new node goes after the body node that precedes it among its
+        # siblings in the primary instance, or first if there is none.
+        # insertions maps a parent ref to a dict from the preceding body
+        # node's ref to the new nodes, in instance order.
+        insertions = {}
+        preceding = {}
+
+        def insert(ref, node):
+            parent_ref = ref[:ref.rfind('/')]
+            insertions.setdefault(parent_ref, {}).setdefault(
+                preceding.get(parent_ref), []).append(node)
+            nodes[ref] = node
+
+        for ref in self._iter_instance_refs():
+            if ref in nodes:
+                preceding[ref[:ref.rfind('/')]] = ref
+                continue
+            question = self._get_question_from_bind_list(ref)
+            if question is None:
+                continue
+            missing_groups = []
+            parent_ref = ref[:ref.rfind('/')]
+            while parent_ref.count('/') > 1 and parent_ref not in nodes:
+                missing_groups.append(parent_ref)
+                parent_ref = parent_ref[:parent_ref.rfind('/')]
+            for group_ref in reversed(missing_groups):
+                insert(group_ref, self._get_bodyless_group(group_ref))
+            insert(ref, question)
+
+        # Bindings that are not in the primary instance go last.
+        for bndng in self.bindings:
+            ref = bndng[constants.NODESET_XFORM]
+            question = self._get_question_from_bind_list(ref)
+            if question is None:
                 continue
-            for child in self.children:
-                if child['ref'] == parent_ref:
-                    question['ref'] = ref
-                    updated = False
-                    for c in child['children']:
-                        if isinstance(c, dict) \
-                                and 'ref' in c and c['ref'] == ref:
-                            c.update(question)
-                            updated = True
-                    if not updated:
-                        child['children'].append(question)
-            if 'ref' not in question:
-                new_ref = u'/'.join(ref.split('/')[2:])
-                root_ref = u'/'.join(ref.split('/')[:2])
-                question_or_choice = self._get_item_func(root_ref, new_ref, bndng)
-                if 'type' not in question_or_choice and 'type' in question:
-                    question_or_choice.update(question)
-                if question_or_choice['type'] == 'group' and question_or_choice[constants.NAME] == 'meta':
-                    question_or_choice['control'] = {'bodyless': True}
-                    question_or_choice['__order'] = self._get_question_order(ref)
-                self.children.append(question_or_choice)
-                self._bind_list.append(bndng)
+            self._get_group_children(nodes, ref[:ref.rfind('/')])\
+                .append(question)
+            nodes[ref] = question
+
+        for parent_ref, new_nodes in insertions.iteritems():
+            if parent_ref.count('/') > 1:
+                children = nodes[parent_ref].setdefault(constants.CHILDREN, [])
+            else:
+                children = self.children
+            merged = new_nodes.get(None, [])
+            for child in children:
+                merged.append(child)
+                merged.extend(new_nodes.get(child.get('ref'), []))
+            children[:] = merged
+
+    def _iter_instance_refs(self):
+        '''
+        Yield the ref of every node in the primary instance in document order.
+        '''
+        for instance in self._model_element.iterchildren(tag=etree.Element):
+            if etree.QName(instance).localname == constants.INSTANCE_XFORM \
+                    and instance.get('id') is None:
                 break
-        if self._bind_list:
-            self._cleanup_bind_list()
-
-    def _get_item_func(self, ref, name, item):
-        rs = {}
-        name_splits = name.split('/')
-        rs[constants.NAME] = name_splits[0]
-        ref = '%s/%s' % (ref, rs[constants.NAME])
-        rs['ref'] = ref
-        if name_splits.__len__() > 1:
-            rs['type'] = 'group'
-            rs['children'] = [
-                self._get_item_func(ref, '/'.join(name_splits[1:]), item)]
-        return rs
+        else:
+            return
+        pending = [(u'', root) for root in
+                   reversed(list(instance.iterchildren(tag=etree.Element)))]
+        while pending:
+            parent_ref, element = pending.pop()
+            ref = u'/'.join([parent_ref, etree.QName(element).localname])
+            yield ref
+            pending.extend((ref, child) for child in
+                reversed(list(element.iterchildren(tag=etree.Element))))
+
+    def _get_question_from_bind_list(self, ref):
+        '''
+        Return the question of a binding that has no body element, or None if
+        the binding at ref has been used already or doesn't exist.
+        '''
+        bndng = self._bindings_by_nodeset.get(ref)
+        if bndng is None or ref in self._bound_nodesets:
+            return None
+        question = self._get_question_params_from_bindings(ref)
+        question[constants.NAME] = self._get_name_from_ref(ref)
+        question['ref'] = ref
+        if 'calculate' in bndng:
+            question['type'] = 'calculate'
+        return question
+
+    def _get_bodyless_group(self, group_ref):
+        group = {
+            constants.NAME: self._get_name_from_ref(group_ref),
+            'ref': group_ref,
+            'type': 'group',
+            constants.CHILDREN: [],
+        }
+        if group[constants.NAME] == 'meta':
+            group['control'] = {'bodyless': True}
+        return group
+
+    def _get_group_children(self, nodes, group_ref):
+        '''
+        Return the children of the group at group_ref, appending it and any
+        of its ancestors that are not in nodes yet.
+        '''
+        missing = []
+        while group_ref.count('/') > 1 and group_ref not in nodes:
+            missing.append(group_ref)
+            group_ref = group_ref[:group_ref.rfind('/')]
+        if group_ref.count('/') > 1:
+            children = nodes[group_ref].setdefault(constants.CHILDREN, [])
+        else:
+            children = self.children
+        for group_ref in reversed(missing):
+            group = self._get_bodyless_group(group_ref)
+            children.append(group)
+            nodes[group_ref] = group
+            children = group[constants.CHILDREN]
+        return children
 
     def survey(self):
-        new_doc = json.dumps(self.new_doc)
-        _survey = builder.create_survey_element_from_json(new_doc)
-        return _survey
-
-    def _get_question_order(self, ref):
-        try:
-            return self.ordered_binding_refs.index(ref)
-        except ValueError:
-            # likely a group
-            for i in self.ordered_binding_refs:
-                if i.startswith(ref):
-                    return self.ordered_binding_refs.index(i) + 1
-            return self.ordered_binding_refs.__len__() + 1
-
-    def _get_question_from_object(self, obj, element_tag=None):
+        return builder.create_survey_element_from_dict(self.new_doc)
+
+    def _get_question_from_object(self, obj, element_tag=None, element=None):
 
         if 'ref' in obj:
             ref = obj['ref']
         elif 'nodeset' in obj:
             ref = obj['nodeset']
         # Look for the 'nodeset' in this question's associated 'bind'.
-        elif any( (True for binding in self.bindings if binding['id'] == obj[constants.BIND]) ):
-            associated_binding= [binding for binding in self.bindings if binding['id'] == obj[constants.BIND]][0]
+        elif obj.get(constants.BIND) in self._bindings_by_id:
+            associated_binding= self._bindings_by_id[obj[constants.BIND]]
             ref= associated_binding[constants.NODESET_XFORM]
         else:
-            raise TypeError('cannot find "ref" or "nodeset" in {} or associated bind {}'.format(repr(obj), associated_binding))
+            raise TypeError('cannot find "ref" or "nodeset" in {} or associated bind {}'.format(repr(obj), obj.get(constants.BIND)))
         
-        question = {'ref': ref, '__order': self._get_question_order(ref)}
+        question = {'ref': ref}
         question[constants.NAME] = self._get_name_from_ref(ref)
         if 'hint' in obj:
             k, v = self._get_label(obj['hint'], 'hint')
@@ -491,8 +582,8 @@ class XFormToDictBuilder:
                 del question[constants.BIND]
         if question_type in ['group', 'repeat']:
             if question_type == 'group' and 'repeat' in obj:
-                question['children'] = \
-                    self._get_children_questions(obj['repeat'])
+                question['children'] = self._get_children_questions(
+                    obj['repeat'], _get_child_element(element, 'repeat'))
                 question_type = 'repeat'
                 if 'count' in obj['repeat']:
                     if 'control' not in question:
@@ -503,7 +594,8 @@ class XFormToDictBuilder:
                                 obj['repeat']['count'].strip())})
             else:
                 # A question group that is not repeated (?).
-                question['children'] = self._get_children_questions(obj)
+                question['children'] = self._get_children_questions(
+                    obj, element)
         if element_tag == constants.TRIGGER_XFORM:
             question_type = constants.TRIGGER_XLSFORM
         if question_type == 'geopoint' and 'hint' in question:
@@ -521,36 +613,37 @@ class XFormToDictBuilder:
             
         return question
 
-    def _get_children_questions(self, obj):
+    def _get_children_questions(self, obj, element):
+        '''
+        Return the questions of the child elements of element in document
+        order. obj is element converted by ConvertXmlToLocalNameDict, where
+        the children with the same tag are listed in document order too.
+        '''
         children = []
-        for k, v in obj.iteritems():
-            if k in ['ref', 'label', 'nodeset']:
+        seen = {}
+        for child in element.iterchildren(tag=etree.Element):
+            tag = etree.QName(child).localname
+            if tag in ['label', 'hint']:
                 continue
-            if isinstance(v, dict):
-                child = self._get_question_from_object(v, element_tag=k)
-                children.append(child)
-            elif isinstance(v, list):
-                for i in v:
-                    child = self._get_question_from_object(i, element_tag=k)
-                    children.append(child)
+            child_obj = obj[tag]
+            if isinstance(child_obj, list):
+                child_obj = child_obj[seen.get(tag, 0)]
+                seen[tag] = seen.get(tag, 0) + 1
+            if isinstance(child_obj, dict):
+                children.append(self._get_question_from_object(
+                    child_obj, element_tag=tag, element=child))
         return children
 
 
     def _get_question_params_from_bindings(self, ref):
         
         # Locate the binding for this form element.
-        for b in self.bindings:
-            if b[constants.NODESET_XFORM] == ref:
-                associated_binding= b
-                break
-        else:
+        associated_binding= self._bindings_by_nodeset.get(ref)
+        if associated_binding is None:
             # No associated binding found.
             return
-        
-        try:
-            self._bind_list.remove(associated_binding)
-        except ValueError:
-            pass
+
+        self._bound_nodesets.add(ref)
         
         # Create a copy of the binding to mutate and record.
         binding_copy= copy.deepcopy(associated_binding)